@@ -1,25 +1,65 @@
 import os
-import tempfile
+import threading
 from pathlib import Path
-from typing import Union, Dict, Any, List, Optional
+from typing import Union, Dict, Any, List, Optional, Tuple
 import numpy as np
-import soundfile as sf
 import torch
 import torchaudio
 from transformers import (
     AutoConfig,
     AutoModel,
     AutoProcessor,
+    StaticCache,
 )
 import warnings
+import functools
 
 try:
-    import bitsandbytes as bnb
-    from bitsandbytes.nn import Int8Params
-    HAS_BITSANDBYTES = True
+    from torchao.quantization import quantize_, Int8WeightOnlyConfig, Int4WeightOnlyConfig
+    HAS_TORCHAO = True
 except ImportError:
-    HAS_BITSANDBYTES = False
-    warnings.warn("bitsandbytes not installed. INT8 mode will not be available. Install with: pip install bitsandbytes")
+    HAS_TORCHAO = False
+    warnings.warn("torchao not installed. INT8/INT4 modes will not be available. Install with: pip install torchao")
+
+# 量化时跳过的层（输出头、词嵌入、音频投影对精度敏感）
+QUANT_SKIP_MODULES = ('lm_head', 'embed_tokens', 'audio_proj')
+
+# 编译后预热使用的音频时长（秒），覆盖实时临时转录到最长语音段的常见输入长度
+COMPILE_WARMUP_SECONDS = (1, 2, 5, 30)
+
+# 转录基础指令
+BASE_INSTRUCTION = "Please transcribe this audio into text"
+
+
+@functools.lru_cache(maxsize=64)
+def format_hotwords_prompt(hotwords: Tuple[str, ...], max_hotwords: int = 10) -> str:
+    """
+    格式化热词提示语句（按热词元组缓存，相同热词列表只构建一次）
+    
+    Args:
+        hotwords: 热词元组（保持调用方给定的顺序）
+        max_hotwords: 最大热词数量限制
+        
+    Returns:
+        格式化后的热词提示字符串
+    """
+    if not hotwords:
+        return ""
+    
+    # 清理热词，并用 dict 按首次出现顺序去重（结果顺序确定）
+    cleaned_hotwords = list(dict.fromkeys(
+        hw.strip().lower()
+        for hw in hotwords
+        if isinstance(hw, str) and hw.strip()
+    ))[:max_hotwords]
+    
+    if not cleaned_hotwords:
+        return ""
+    
+    # 构建提示语句
+    hotwords_str = ", ".join(f'"{hw}"' for hw in cleaned_hotwords)
+    return f". Pay special attention to these important terms: {hotwords_str}"
+
 
 class ASRModel:
     def __init__(
@@ -28,43 +68,65 @@ class ASRModel:
         device: str = "cuda", 
         mode: str = "native",
         cpu_threads: Optional[int] = None,
-        cpu_interop_threads: Optional[int] = None
+        cpu_interop_threads: Optional[int] = None,
+        compile_model: bool = False,
+        assistant_checkpoint_dir: Optional[str] = None,
+        prompt_lookup_num_tokens: int = 0,
+        static_cache_len: int = 0
     ):
         """
-        初始化 ASR 模型，支持原生模式和 INT8 量化模式。
+        初始化 ASR 模型，支持原生模式和 INT8/INT4 量化模式。
         
         Args:
             checkpoint_dir: 模型检查点目录路径。
             device: 运行设备 ("cuda" 或 "cpu")。
-            mode: 运行模式，可选 "native" (原生 bfloat16) 或 "int8" (8-bit 量化)
+            mode: 运行模式，可选 "native" (原生 bfloat16)、"int8" (8-bit 量化) 或 "int4" (4-bit 分组量化)
                 - "native": 使用 torch.bfloat16，精度高，显存占用大
-                - "int8": 使用 8-bit 量化，显存占用小，适合 GTX1060 等小显存显卡
+                - "int8": 使用 torchao 权重 INT8 量化（激活保持 bfloat16），显存占用小，适合 GTX1060 等小显存显卡
+                - "int4": 使用 torchao 权重 INT4 分组量化 (group_size=128)，权重带宽再减半，仅支持 CUDA
             cpu_threads: CPU推理时使用的线程数，None表示使用所有可用核心
             cpu_interop_threads: CPU内部操作线程数，通常设置为1
+            compile_model: 是否使用 torch.compile + 静态 KV 缓存编译解码循环（仅 CUDA 生效）
+            assistant_checkpoint_dir: 草稿模型目录，设置后启用推测解码（需与主模型共享分词器）
+            prompt_lookup_num_tokens: 提示查找解码每步推测的 token 数，0 表示禁用（未设置草稿模型时生效）
+            static_cache_len: 预分配静态 KV 缓存的长度（提示 + 生成 token 上限），0 表示禁用（仅 CUDA 生效）
         """
         # 验证模式
-        if mode not in ["native", "int8"]:
-            raise ValueError("mode must be either 'native' or 'int8'")
+        if mode not in ["native", "int8", "int4"]:
+            raise ValueError("mode must be one of 'native', 'int8' or 'int4'")
         
-        if mode == "int8" and not HAS_BITSANDBYTES:
-            raise ImportError("INT8 mode requires bitsandbytes. Install with: pip install bitsandbytes")
+        if mode in ("int8", "int4") and not HAS_TORCHAO:
+            raise ImportError(f"{mode.upper()} mode requires torchao. Install with: pip install torchao")
         
         # 确定设备
         self.device = torch.device(device if torch.cuda.is_available() else "cpu")
         self.mode = mode
         
+        if mode == "int4" and self.device.type != "cuda":
+            raise ValueError("INT4 mode requires a CUDA device")
+        
         # 设置CPU多线程（必须在加载模型前设置）
         if self.device.type == "cpu":
             self._setup_cpu_threads(cpu_threads, cpu_interop_threads)
+        else:
+            self._setup_cuda_backends()
         
         # 设置模型数据类型
-        self.model_dtype = torch.bfloat16 if mode == "native" else torch.float16
+        # 量化模式仅压缩权重，激活同样使用 bfloat16（torchao 量化内核按 bfloat16 实现）；
+        # 原生模式在 Ampere 之前的 GPU 上没有原生 bfloat16 运算单元，改用 float16
+        self.model_dtype = torch.bfloat16
+        if mode == "native" and self.device.type == "cuda" and not torch.cuda.is_bf16_supported():
+            self.model_dtype = torch.float16
         
         self.checkpoint_dir = Path(checkpoint_dir)
         
         # 加载 Processor
         self.processor = AutoProcessor.from_pretrained(str(self.checkpoint_dir))
         self.target_sr = self.processor.feature_extractor.sampling_rate
+        # 重采样器缓存：输入采样率 -> Resample，避免每次调用重复构建滤波核
+        self._resamplers: Dict[int, torchaudio.transforms.Resample] = {}
+        # CUDA 上在 GPU 计算 Mel 特征（不支持时自动回退）
+        self._gpu_feature_extraction = self.device.type == "cuda"
         
         # 加载配置
         self.config = AutoConfig.from_pretrained(self.checkpoint_dir, trust_remote_code=True)
@@ -76,13 +138,41 @@ class ASRModel:
         print(f"🔍 检测到模型类型: {'GLM-ASR' if self.is_glm_asr else '其他模型'}")
 
         # 加载模型
-        if mode == "int8" and self.is_glm_asr:
-            self.model = self._load_glm_asr_int8()
+        if mode == "int8":
+            self.model = self._load_model_quantized(Int8WeightOnlyConfig())
+        elif mode == "int4":
+            self.model = self._load_model_quantized(Int4WeightOnlyConfig(group_size=128))
         else:
-            self.model = self._load_model_standard(mode)
+            self.model = self._load_model_standard()
         
         self.model.eval()
         
+        # 推测解码：草稿模型优先，否则可选提示查找解码（贪心解码下输出与逐 token 解码一致）
+        self.assistant_model = None
+        if assistant_checkpoint_dir:
+            print(f"🔧 加载推测解码草稿模型: {assistant_checkpoint_dir}")
+            self.assistant_model = self._from_pretrained(
+                checkpoint_dir=assistant_checkpoint_dir,
+                trust_remote_code=True,
+                torch_dtype=self.model_dtype,
+            ).to(self.device).eval()
+        self.prompt_lookup_num_tokens = prompt_lookup_num_tokens
+        
+        # 实时转录与文件转录在不同工作线程中调用同一模型，generate() 与共享的静态缓存需串行访问
+        self._generate_lock = threading.Lock()
+        # 批量转录临时修改共享 tokenizer 的 padding_side，修改、编码与恢复需作为整体互斥
+        self._padding_side_lock = threading.Lock()
+        
+        # 预分配静态 KV 缓存，跨调用复用
+        self._kv_cache = None
+        if static_cache_len > 0 and self.device.type == "cuda":
+            self._init_static_cache(static_cache_len)
+        
+        # 编译解码循环（静态形状 + CUDA Graph）
+        self.is_compiled = False
+        if compile_model and self.device.type == "cuda":
+            self._compile_model()
+        
         # 打印模型信息
         self._print_model_info()
 
@@ -117,97 +207,138 @@ class ASRModel:
         # 打印当前线程配置
         print(f"📊 CPU线程配置: 计算线程={torch.get_num_threads()}, 内部操作线程={torch.get_num_interop_threads()}")
 
-    def _load_model_standard(self, mode: str):
-        """标准方式加载模型（原生模式或非GLM-ASR的INT8模式）"""
+    def _setup_cuda_backends(self):
+        """启用 TF32 Tensor Core 计算与 cuDNN 自动算法选择（Ampere 及以上 GPU 生效）"""
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+        # 音频编码器的卷积输入形状固定，benchmark 只需在首次调用时搜索一次最优算法
+        torch.backends.cudnn.benchmark = True
+        torch.set_float32_matmul_precision("high")
+        print("🔧 已启用 TF32 矩阵运算与 cuDNN benchmark")
+
+    def _select_attn_implementation(self) -> str:
+        """选择注意力后端：Ampere 及以上 GPU 且安装了 flash-attn 时使用 FlashAttention-2，否则使用 SDPA"""
+        if self.device.type == "cuda" and torch.cuda.get_device_capability(self.device) >= (8, 0):
+            try:
+                import flash_attn  # noqa: F401
+                return "flash_attention_2"
+            except ImportError:
+                pass
+        return "sdpa"
+
+    def _from_pretrained(self, checkpoint_dir: Optional[Union[str, Path]] = None, **model_kwargs):
+        """加载模型权重（默认主模型目录），优先使用融合注意力后端，不支持时回退到 SDPA"""
+        checkpoint_dir = checkpoint_dir or self.checkpoint_dir
+        attn_implementation = self._select_attn_implementation()
+        try:
+            model = AutoModel.from_pretrained(
+                checkpoint_dir,
+                attn_implementation=attn_implementation,
+                **model_kwargs
+            )
+        except (ValueError, ImportError, RuntimeError) as e:
+            if attn_implementation == "sdpa":
+                raise
+            print(f"⚠️ {attn_implementation} 不可用，回退到 SDPA: {e}")
+            attn_implementation = "sdpa"
+            model = AutoModel.from_pretrained(
+                checkpoint_dir,
+                attn_implementation=attn_implementation,
+                **model_kwargs
+            )
+        print(f"🔧 注意力后端: {attn_implementation}")
+        return model
+
+    def _load_model_standard(self):
+        """标准方式加载模型（原生 bfloat16 模式）"""
         model_kwargs = {
             "trust_remote_code": True,
+            "torch_dtype": self.model_dtype,
         }
         
         if self.device.type == "cuda":
-            model_kwargs["device_map"] = "auto" if mode == "int8" else str(self.device)
-        
-        if mode == "native":
-            model_kwargs["torch_dtype"] = self.model_dtype
-        
-        if mode == "int8" and not self.is_glm_asr:
-            # 非GLM-ASR模型使用标准的load_in_8bit
-            model_kwargs["load_in_8bit"] = True
+            model_kwargs["device_map"] = str(self.device)
         
         # 加载模型
-        model = AutoModel.from_pretrained(
-            self.checkpoint_dir,
-            **model_kwargs
-        )
+        model = self._from_pretrained(**model_kwargs)
         
         # 原生模式需要手动移动到设备
-        if mode == "native" and self.device.type == "cuda":
+        if self.device.type == "cuda":
             model = model.to(self.device)
         
         return model
 
-    def _load_glm_asr_int8(self):
-        """专门处理GLM-ASR模型的8-bit量化加载"""
-        print("🔧 使用手动量化方式加载 GLM-ASR 模型 (INT8 模式)")
-        
-        # 1. 首先以float16加载模型到CPU
-        with torch.device('cpu'):
-            model = AutoModel.from_pretrained(
-                self.checkpoint_dir,
-                torch_dtype=torch.float16,
-                trust_remote_code=True,
-            )
-        
-        # 2. 应用8-bit量化
-        self._quantize_model_int8(model)
+    def _load_model_quantized(self, quant_config):
+        """加载模型并应用 torchao 权重量化（INT8 / INT4 模式）"""
+        print(f"🔧 使用 torchao 权重量化方式加载模型 ({self.mode.upper()} 模式)")
         
-        # 3. 移动到GPU
+        # 1. 以 bfloat16 直接加载到目标设备
+        model_kwargs = {
+            "trust_remote_code": True,
+            "torch_dtype": self.model_dtype,
+        }
         if self.device.type == "cuda":
-            model = model.to(self.device)
+            model_kwargs["device_map"] = str(self.device)
+        model = self._from_pretrained(**model_kwargs)
+        
+        # 2. 应用权重量化（在设备上原地完成，无需 CPU 往返）
+        self._quantize_model(model, quant_config)
         
         return model
 
-    def _quantize_model_int8(self, model):
-        """手动将模型转换为8-bit量化"""
-        print("⚡ 应用 8-bit 量化到模型...")
+    def _quantize_model(self, model, quant_config):
+        """将线性层权重按 quant_config 量化（跳过 QUANT_SKIP_MODULES 中的层）"""
+        print(f"⚡ 应用权重 {self.mode.upper()} 量化到模型...")
         
-        for name, module in model.named_modules():
-            if isinstance(module, torch.nn.Linear):
-                # 跳过不需要量化的层（如lm_head）
-                if any(skip_name in name for skip_name in ['lm_head', 'embed_tokens', 'audio_proj']):
-                    continue
-                
-                print(f"  📦 量化线性层: {name}")
-                
-                # 创建8-bit线性层
-                quantized_linear = bnb.nn.Linear8bitLt(
-                    module.in_features,
-                    module.out_features,
-                    bias=module.bias is not None,
-                    has_fp16_weights=False,  # 使用纯INT8
-                    threshold=6.0,  # 默认阈值
-                )
-                
-                # 复制权重并量化
-                quantized_linear.weight = bnb.nn.Int8Params(
-                    module.weight.data.cpu(), 
-                    requires_grad=False, 
-                    has_fp16_weights=False
-                )
-                
-                if module.bias is not None:
-                    quantized_linear.bias = torch.nn.Parameter(module.bias.data.cpu())
-                
-                # 替换原模块
-                parent_name = '.'.join(name.split('.')[:-1])
-                child_name = name.split('.')[-1]
-                
-                if parent_name:
-                    parent_module = dict(model.named_modules())[parent_name]
-                    setattr(parent_module, child_name, quantized_linear)
-                else:
-                    setattr(model, child_name, quantized_linear)
+        def filter_fn(module: torch.nn.Module, fqn: str) -> bool:
+            return isinstance(module, torch.nn.Linear) and not any(
+                skip_name in fqn for skip_name in QUANT_SKIP_MODULES
+            )
+        
+        quantize_(model, quant_config, filter_fn=filter_fn)
         
-        print("✅ 8-bit 量化完成")
+        print(f"✅ {self.mode.upper()} 量化完成")
+
+    def _init_static_cache(self, max_cache_len: int):
+        """预分配 batch=1 的静态 KV 缓存，避免每次 generate 重新分配显存"""
+        try:
+            self._kv_cache = StaticCache(
+                config=self.model.config.get_text_config(),
+                max_batch_size=1,
+                max_cache_len=max_cache_len,
+                device=self.device,
+                dtype=self.model_dtype,
+            )
+            print(f"🔧 已预分配静态 KV 缓存 (长度: {max_cache_len})")
+        except Exception as e:
+            print(f"⚠️ 静态 KV 缓存预分配失败，使用动态缓存: {e}")
+            self._kv_cache = None
+
+    def _compile_model(self):
+        """使用 torch.compile 编译模型前向，并启用静态 KV 缓存以便捕获 CUDA Graph"""
+        print("⚙️ 编译模型前向 (torch.compile, mode=reduce-overhead)...")
+        try:
+            # 已预分配静态 KV 缓存时直接复用，否则由 generate 内部创建静态缓存
+            if self._kv_cache is None:
+                self.model.generation_config.cache_implementation = "static"
+            self.model.forward = torch.compile(
+                self.model.forward,
+                mode="reduce-overhead",
+                fullgraph=False,
+                dynamic=False
+            )
+            self.is_compiled = True
+            
+            # 预热：按代表性时长逐一触发编译（dynamic=False 下每种输入长度单独特化），
+            # 服务在模型加载完成后才开始接收请求，编译开销不会落到用户请求上
+            for seconds in COMPILE_WARMUP_SECONDS:
+                self.transcribe(torch.zeros(1, seconds * self.target_sr), sampling_rate=self.target_sr, max_new_tokens=8)
+            print(f"✅ 模型编译与预热完成 (预热时长: {COMPILE_WARMUP_SECONDS}s)")
+        except Exception as e:
+            print(f"⚠️ 模型编译失败，回退到 eager 模式: {e}")
+            self.model.generation_config.cache_implementation = None
+            self.model.forward = type(self.model).forward.__get__(self.model)
+            self.is_compiled = False
 
     def _print_model_info(self):
         """打印模型信息和显存使用情况"""
@@ -224,25 +355,40 @@ class ASRModel:
         trainable_params = sum(p.numel() for p in self.model.parameters() if p.requires_grad)
         print(f"📊 模型参数: 总计 {total_params/1e9:.2f}B | 可训练 {trainable_params/1e9:.2f}B")
         
-        if self.mode == "int8":
+        if self.mode == "int4":
+            print("💡 INT4 模式提示: 权重显存与带宽约为 INT8 的一半，解码更快，但精度下降可能更明显。")
+        elif self.mode == "int8":
             print("💡 INT8 模式提示: 显存占用大幅降低，但精度可能略有下降。适合 GTX1060 等小显存显卡。")
 
-    def _prepare_audio_tempfile(self, audio_tensor: torch.Tensor, sampling_rate: int) -> str:
+    def _get_resampler(self, sampling_rate: int, device: torch.device) -> torchaudio.transforms.Resample:
+        """获取（必要时创建并缓存）指定输入采样率的重采样器"""
+        resampler = self._resamplers.get(sampling_rate)
+        if resampler is None:
+            resampler = torchaudio.transforms.Resample(
+                orig_freq=sampling_rate,
+                new_freq=self.target_sr,
+                dtype=torch.float32
+            )
+            self._resamplers[sampling_rate] = resampler
+        if resampler.kernel.device != device:
+            resampler = resampler.to(device)
+        return resampler
+
+    def _prepare_audio_array(self, audio_tensor: torch.Tensor, sampling_rate: int) -> np.ndarray:
         """
-        预处理音频张量并保存到临时 WAV 文件。
+        预处理音频张量，返回可直接送入 processor 的 numpy 数组。
         
         处理流程：
         1. 确保单声道。
         2. 重采样至目标采样率。
         3. 归一化。
-        4. 保存至临时文件。
         
         Args:
-            audio_tensor: 输入音频张量 (Channel, Time) 或。
+            audio_tensor: 输入音频张量 (Channel, Time) 或 (Time,)。
             sampling_rate: 原始采样率。
             
         Returns:
-            临时文件的绝对路径。
+            目标采样率下的一维 float32 数组。
         """
         # 处理 1D 输入 -> 2D (1, N)
         if audio_tensor.dim() == 1:
@@ -252,85 +398,111 @@ class ASRModel:
         wav = audio_tensor[:1, :]
 
         # 重采样 (如果采样率不匹配)
-        if sampling_rate != self.target_sr:
-            # 每次实例化 Resample 可能会有开销，但能动态适应不同输入采样率
-            resampler = torchaudio.transforms.Resample(
-                orig_freq=sampling_rate, 
-                new_freq=self.target_sr
-            )
-            wav = resampler(wav)
+        resampled = sampling_rate != self.target_sr
+        if resampled:
+            wav = self._get_resampler(sampling_rate, wav.device)(wav)
 
         # 归一化 (保持原逻辑：避免除零，并归一化到 [-1, 1])
         # 注意：这会改变音频的绝对响度，但保持相对动态范围
-        max_val = torch.max(torch.abs(wav))
+        # 无穷范数在单次遍历中完成 abs+max，避免分配 |wav| 中间张量
+        max_val = torch.linalg.vector_norm(wav, ord=float('inf')).item()
         if max_val > 1e-6:
-            wav = wav / max_val
+            if not resampled:
+                wav = wav.clone()  # wav 仍是调用方张量的视图，原地缩放前先复制
+            wav.mul_(1.0 / max_val)
             
-        # 创建临时文件
-        # 使用 delete=False，因为我们需要在上下文之外由 processor 读取它
-        # 文件将在 transcribe 结束时手动删除
-        fd, tmp_path = tempfile.mkstemp(suffix='.wav')
-        os.close(fd) # 关闭文件描述符，让 soundfile 可以打开它
-        
-        # 保存音频
-        sf.write(tmp_path, wav.squeeze(0).cpu().numpy(), self.target_sr)
-        
-        return tmp_path
+        # 直接返回内存数组，processor 无需再经由临时 WAV 文件读写
+        return wav.squeeze(0).to(dtype=torch.float32).cpu().numpy()
 
     def _prepare_model_inputs(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
         准备模型输入数据，确保张量位于正确的设备和拥有正确的精度。
+        
+        CUDA 设备上先将张量复制到锁页内存，再异步拷贝到显存，使 H2D 传输与随后启动的计算重叠。
         """
+        non_blocking = self.device.type == "cuda"
         prepared_inputs = {}
         for key, value in inputs.items():
             if isinstance(value, torch.Tensor):
+                if non_blocking and not value.is_pinned():
+                    value = value.pin_memory()
                 # input_ids 和 attention_mask 必须是 long 类型
                 if key in ("input_ids", "attention_mask"):
-                    prepared_inputs[key] = value.to(self.device, dtype=torch.long)
+                    prepared_inputs[key] = value.to(self.device, dtype=torch.long, non_blocking=non_blocking)
                 # 其他浮点张量转换为模型精度
                 elif value.is_floating_point():
-                    if self.mode == "native":
-                        prepared_inputs[key] = value.to(self.device, dtype=self.model_dtype)
-                    else:
-                        # INT8 模式使用 float16
-                        prepared_inputs[key] = value.to(self.device, dtype=torch.float16)
+                    prepared_inputs[key] = value.to(self.device, dtype=self.model_dtype, non_blocking=non_blocking)
                 else:
-                    prepared_inputs[key] = value.to(self.device)
+                    prepared_inputs[key] = value.to(self.device, non_blocking=non_blocking)
             else:
                 prepared_inputs[key] = value
         return prepared_inputs
 
-    def _format_hotwords_prompt(self, hotwords: List[str], max_hotwords: int = 10) -> str:
+    def _build_messages(self, audio_array: np.ndarray, hotwords: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """构建符合 chat template 格式的单条对话消息"""
+        # 基础指令 + 热词提示（如果提供）
+        full_instruction = BASE_INSTRUCTION + format_hotwords_prompt(tuple(hotwords or ()))
+        
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "audio", "audio": audio_array},
+                    {"type": "text", "text": full_instruction},
+                ],
+            }
+        ]
+
+    def _apply_chat_template(self, conversations, **kwargs) -> Dict[str, Any]:
         """
-        格式化热词提示语句
+        应用 chat template 并提取音频特征。
         
-        Args:
-            hotwords: 热词列表
-            max_hotwords: 最大热词数量限制
-            
-        Returns:
-            格式化后的热词提示字符串
+        CUDA 设备上让 Whisper 特征提取器在 GPU 上计算 STFT + Mel（torch 实现），
+        替代 CPU 上的 numpy 实现；若当前 processor 不接受 device 参数则回退并不再尝试。
         """
-        if not hotwords:
-            return ""
-        
-        # 清理和去重热词
-        cleaned_hotwords = [
-            hw.strip().lower() 
-            for hw in set(hotwords) 
-            if hw and isinstance(hw, str) and hw.strip()
-        ]
-        
-        if not cleaned_hotwords:
-            return ""
-        
-        # 限制热词数量
-        if len(cleaned_hotwords) > max_hotwords:
-            cleaned_hotwords = cleaned_hotwords[:max_hotwords]
-        
-        # 构建提示语句
-        hotwords_str = ", ".join(f'"{hw}"' for hw in cleaned_hotwords)
-        return f". Pay special attention to these important terms: {hotwords_str}"
+        template_kwargs = {
+            "tokenize": True,
+            "add_generation_prompt": True,
+            "return_dict": True,
+            "return_tensors": "pt",
+            **kwargs,
+        }
+        if self._gpu_feature_extraction:
+            try:
+                return self.processor.apply_chat_template(
+                    conversations, device=self.device.type, **template_kwargs
+                )
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ 特征提取器不支持 GPU 计算，回退到 CPU: {e}")
+                self._gpu_feature_extraction = False
+        return self.processor.apply_chat_template(conversations, **template_kwargs)
+
+    def _generate(self, inputs: Dict[str, Any], max_new_tokens: int) -> torch.Tensor:
+        """执行贪心解码生成（batch=1 时按配置启用推测解码）"""
+        generate_kwargs = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": False,
+        }
+        # 辅助/推测解码与预分配静态缓存均仅支持 batch=1
+        batch_size, input_length = inputs["input_ids"].shape
+        with self._generate_lock:
+            if batch_size == 1:
+                if self.assistant_model is not None:
+                    generate_kwargs["assistant_model"] = self.assistant_model
+                elif self.prompt_lookup_num_tokens > 0:
+                    generate_kwargs["prompt_lookup_num_tokens"] = self.prompt_lookup_num_tokens
+                elif (self._kv_cache is not None
+                      and input_length + max_new_tokens <= self._kv_cache.max_cache_len):
+                    self._kv_cache.reset()
+                    generate_kwargs["past_key_values"] = self._kv_cache
+            
+            with torch.inference_mode():
+                if self.mode == "native" and self.device.type == "cuda":
+                    # 原生模式使用 autocast 优化性能
+                    with torch.autocast(device_type='cuda', dtype=self.model_dtype):
+                        return self.model.generate(**inputs, **generate_kwargs)
+                # 量化模式或 CPU 模式直接推理
+                return self.model.generate(**inputs, **generate_kwargs)
 
     def transcribe(
         self, 
@@ -353,7 +525,6 @@ class ASRModel:
         Returns:
             转录后的文本字符串，或包含调试信息的字典（如果 return_debug_info=True）
         """
-        temp_audio_path = None
         start_time = torch.cuda.Event(enable_timing=True) if self.device.type == "cuda" else None
         end_time = torch.cuda.Event(enable_timing=True) if self.device.type == "cuda" else None
         
@@ -368,35 +539,14 @@ class ASRModel:
                 import time
                 start_time_cpu = time.time()
             
-            # 1. 预处理音频并获取临时文件路径
-            temp_audio_path = self._prepare_audio_tempfile(audio_tensor, sampling_rate)
+            # 1. 预处理音频为内存数组
+            audio_array = self._prepare_audio_array(audio_tensor, sampling_rate)
 
-            # 2. 构建基础指令
-            base_instruction = "Please transcribe this audio into text"
-            
-            # 3. 添加热词提示（如果提供）
-            hotwords_prompt = self._format_hotwords_prompt(hotwords or [])
-            full_instruction = base_instruction + hotwords_prompt
-
-            # 4. 构建符合 chat template 格式的消息
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "audio", "url": temp_audio_path},
-                        {"type": "text", "text": full_instruction},
-                    ],
-                }
-            ]
+            # 2-4. 构建符合 chat template 格式的消息（含热词提示）
+            messages = self._build_messages(audio_array, hotwords)
 
             # 5. 应用 chat template 并转换为张量
-            inputs = self.processor.apply_chat_template(
-                messages,
-                tokenize=True,
-                add_generation_prompt=True,
-                return_dict=True,
-                return_tensors="pt"
-            )
+            inputs = self._apply_chat_template(messages)
 
             # 6. 转换数据类型并移动到设备
             inputs = self._prepare_model_inputs(inputs)
@@ -404,22 +554,7 @@ class ASRModel:
             input_length = inputs["input_ids"].shape[1]
 
             # 7. 推理生成
-            with torch.no_grad():
-                if self.mode == "native" and self.device.type == "cuda":
-                    # 原生模式使用 autocast 优化性能
-                    with torch.autocast(device_type='cuda', dtype=self.model_dtype):
-                        outputs = self.model.generate(
-                            **inputs,
-                            max_new_tokens=max_new_tokens,
-                            do_sample=False,
-                        )
-                else:
-                    # INT8 模式或 CPU 模式直接推理
-                    outputs = self.model.generate(
-                        **inputs,
-                        max_new_tokens=max_new_tokens,
-                        do_sample=False,
-                    )
+            outputs = self._generate(inputs, max_new_tokens)
 
             # 8. 解码结果
             generated_tokens = outputs[:, input_length:]
@@ -438,10 +573,6 @@ class ASRModel:
                 end_time_cpu = time.time()
                 elapsed_time = end_time_cpu - start_time_cpu
 
-            # 9. 清理缓存
-            if self.device.type == "cuda":
-                torch.cuda.empty_cache()
-
             if return_debug_info:
                 debug_info = {
                     "transcript": transcript,
@@ -472,20 +603,65 @@ class ASRModel:
                 print("⚠️ 显存不足！建议：")
                 print("   1. 使用更短的音频")
                 print("   2. 减少 max_new_tokens")
-                print("   3. 如果使用原生模式，切换到 INT8 模式")
-            elif "load_in_8bit" in error_msg:
-                print("⚠️ 模型不支持直接加载 8-bit，已自动切换到手动量化方式")
+                print("   3. 如果使用原生模式，切换到 INT8 / INT4 模式")
             raise e
         except Exception as e:
             print(f"❌ 转录过程中发生错误: {str(e)}")
             raise e
-        finally:
-            # 9. 清理临时文件 (确保无论是否出错都执行)
-            if temp_audio_path and os.path.exists(temp_audio_path):
-                try:
-                    os.unlink(temp_audio_path)
-                except Exception as e:
-                    print(f"⚠️ 无法删除临时文件 {temp_audio_path}: {e}")
+
+    def transcribe_batch(
+        self,
+        audio_tensors: List[torch.Tensor],
+        sampling_rate: int = 16000,
+        max_new_tokens: int = 128,
+        hotwords: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        批量转录多段音频，在一次 generate() 调用中完成，提高 GPU 利用率
+        
+        Args:
+            audio_tensors: 输入音频张量列表。
+            sampling_rate: 音频采样率（所有音频相同）。
+            max_new_tokens: 每段最大生成的 token 数量。
+            hotwords: 需要特别关注的热词列表（所有音频共用）。
+            
+        Returns:
+            与输入顺序一致的转录文本列表。
+        """
+        if not audio_tensors:
+            return []
+        
+        conversations = [
+            self._build_messages(self._prepare_audio_array(audio_tensor, sampling_rate), hotwords)
+            for audio_tensor in audio_tensors
+        ]
+        
+        # 解码器生成需要左侧填充，使所有行的生成内容都从同一位置开始
+        # 多个工作线程可能同时进入，持锁保证恢复的是真正的原值、且编码期间不被其他线程改回右侧填充
+        tokenizer = self.processor.tokenizer
+        with self._padding_side_lock:
+            padding_side = tokenizer.padding_side
+            tokenizer.padding_side = "left"
+            try:
+                inputs = self._apply_chat_template(conversations, padding=True)
+            finally:
+                tokenizer.padding_side = padding_side
+        
+        inputs = self._prepare_model_inputs(inputs)
+        input_length = inputs["input_ids"].shape[1]
+        
+        try:
+            outputs = self._generate(inputs, max_new_tokens)
+        except RuntimeError as e:
+            if "out of memory" in str(e).lower():
+                print(f"⚠️ 批量转录显存不足 (batch={len(audio_tensors)})，建议减小批大小")
+            raise e
+        
+        transcripts = self.processor.batch_decode(
+            outputs[:, input_length:],
+            skip_special_tokens=True
+        )
+        return [transcript.strip() for transcript in transcripts]
 
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型详细信息"""
@@ -496,6 +672,12 @@ class ASRModel:
             "target_sampling_rate": self.target_sr,
             "checkpoint_dir": str(self.checkpoint_dir),
             "is_glm_asr": self.is_glm_asr,
+            "is_compiled": self.is_compiled,
+            "speculative_decoding": (
+                "assistant_model" if self.assistant_model is not None
+                else "prompt_lookup" if self.prompt_lookup_num_tokens > 0
+                else None
+            ),
         }
         
         if self.device.type == "cuda":
@@ -534,13 +716,13 @@ if __name__ == "__main__":
         asr_int8 = ASRModel(
             checkpoint_dir="./glm-asr-model",
             device="cuda", 
-            mode="int8"  # 8-bit 量化模式
+            mode="int8"  # 权重 INT8 量化模式
         )
         print("✅ INT8 模式模型初始化成功")
         print(f"模型信息: {asr_int8.get_model_info()}")
     except Exception as e:
         print(f"❌ INT8 模式初始化失败: {e}")
-        print("💡 提示: 确保已安装 bitsandbytes: pip install bitsandbytes")
+        print("💡 提示: 确保已安装 torchao: pip install torchao")
 
     # 示例3：CPU 模式（无 GPU 时）
     try:
@@ -1,76 +1,122 @@
 import os
 import time
+import asyncio
+import math
+from collections import deque
 import logging
+import numpy as np
 from config import AppConfig
 from data_basic import AudioChunk, SpeechSegment
-from typing import Optional, List
+from typing import Optional, List, Deque
 
 logger = logging.getLogger("speech-to-text")
 
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
 
 class AudioBufferManager:
     """音频缓冲区管理器，处理音频片段的存储和检索"""
     def __init__(self):
-        self.chunk_buffer: Dict[int, AudioChunk] = {}  # chunk_id -> AudioChunk
-        self.speech_segments: List[SpeechSegment] = []
+        # 环形缓冲区：容量覆盖 MAX_AUDIO_BUFFER_SECONDS 的片段数（外加少量余量），
+        # chunk_id % capacity 定位槽位，新片段直接覆盖最旧片段，无需定期清理
+        self.capacity = math.ceil(AppConfig.MAX_AUDIO_BUFFER_SECONDS * 1000 / AppConfig.AUDIO_CHUNK_DURATION_MS) + 8
+        self.chunk_slots: List[Optional[AudioChunk]] = [None] * self.capacity
+        # 所有片段的样本保存在同一块连续 float32 存储中，槽位 i 对应 [i*spc, (i+1)*spc)；
+        # 写入时一次性由 int16 归一化到 [-1, 1]，VAD 与 ASR 直接复用，无需各自再转换
+        self.samples_per_chunk = AppConfig.AUDIO_CHUNK_SIZE // 2
+        self.pcm = np.zeros(self.capacity * self.samples_per_chunk, dtype=np.float32)
+        # 有界队列：超过 MAX_SPEECH_SEGMENTS 时 append 自动淘汰最旧的段
+        self.speech_segments: Deque[SpeechSegment] = deque(maxlen=AppConfig.MAX_SPEECH_SEGMENTS)
         self.current_segment: Optional[SpeechSegment] = None
+        self.first_chunk_id = 0  # 缓冲区中曾写入的最小片段ID（清理后重置）
         self.next_chunk_id = 0
+        self.first_unprocessed_id = 0  # VAD 游标：小于该ID的片段均已被VAD消费
+        # VAD 唤醒事件：未处理片段数达到 vad_wait_chunks 时置位，VAD 循环无需逐片段轮询
+        self.vad_ready = asyncio.Event()
+        self.vad_wait_chunks = 1
+        self.next_segment_id = 0
         self.buffer_start_time = time.time()
-        self.last_cleanup_time = time.time()
+        
+    def __len__(self) -> int:
+        """缓冲区中当前保存的片段数"""
+        return min(self.next_chunk_id - self.first_chunk_id, self.capacity)
+    
+    @property
+    def pending_vad_chunks(self) -> int:
+        """尚未被VAD消费的片段数"""
+        return self.next_chunk_id - self.first_unprocessed_id
+    
+    @property
+    def oldest_chunk_id(self) -> int:
+        """缓冲区中仍可访问的最旧片段ID"""
+        return max(self.first_chunk_id, self.next_chunk_id - self.capacity)
         
     def add_audio_chunk(self, audio_data: bytes) -> AudioChunk:
-        """添加音频片段到缓冲区"""
+        """添加音频片段到缓冲区（覆盖最旧的槽位）"""
         current_time = time.time()
         chunk_id = self.next_chunk_id
         self.next_chunk_id += 1
         
-        chunk = AudioChunk(chunk_id, current_time, audio_data)
-        self.chunk_buffer[chunk_id] = chunk
+        # 写入连续 PCM 存储，片段只持有该槽位的视图
+        slot = chunk_id % self.capacity
+        slot_start = slot * self.samples_per_chunk
+        slot_samples = self.pcm[slot_start:slot_start + self.samples_per_chunk]
+        samples = np.frombuffer(audio_data, dtype=np.int16, count=min(len(audio_data) // 2, self.samples_per_chunk))
+        np.multiply(samples, _INT16_SCALE, out=slot_samples[:len(samples)], casting='unsafe')
+        slot_samples[len(samples):] = 0
+        
+        # 每帧创建新的片段对象：VAD 累积区或转录中的语音段可能仍持有被覆盖槽位的旧片段，
+        # 复用对象会使其 chunk_id / timestamp 被静默改写
+        chunk = AudioChunk(chunk_id, current_time, slot_samples)
+        self.chunk_slots[slot] = chunk
         
-        # 清理旧数据
-        self._cleanup_old_chunks()
+        if self.next_chunk_id - self.first_unprocessed_id >= self.vad_wait_chunks:
+            self.vad_ready.set()
         
         return chunk
     
-    def _cleanup_old_chunks(self):
-        """清理超过最大缓冲区的旧片段"""
-        current_time = time.time()
-        if current_time - self.last_cleanup_time < 1.0:  # 每秒清理一次
-            return
-            
-        self.last_cleanup_time = current_time
-        
-        # 计算保留的最小时间
-        min_time = current_time - AppConfig.MAX_AUDIO_BUFFER_SECONDS
-        
-        # 移除过期的片段
-        old_chunk_ids = [cid for cid, chunk in self.chunk_buffer.items() 
-                        if chunk.timestamp < min_time]
-        
-        for cid in old_chunk_ids:
-            if cid in self.chunk_buffer:
-                del self.chunk_buffer[cid]
-        
-        # 移除过期的语音段
-        self.speech_segments = [seg for seg in self.speech_segments 
-                               if seg.start_time >= min_time]
-        
-        logger.debug(f"🧹 缓冲区清理完成，剩余片段: {len(self.chunk_buffer)}, 剩余语音段: {len(self.speech_segments)}")
+    def get_chunk(self, chunk_id: int) -> Optional[AudioChunk]:
+        """按ID获取片段，已被覆盖或不存在时返回 None"""
+        if not self.oldest_chunk_id <= chunk_id < self.next_chunk_id:
+            return None
+        return self.chunk_slots[chunk_id % self.capacity]
     
     def get_chunks_for_vad(self, window_size: int = AppConfig.VAD_SMOOTHING_WINDOW) -> List[AudioChunk]:
-        """获取最近的N个片段用于VAD处理"""
-        recent_chunks = sorted(
-            [chunk for chunk in self.chunk_buffer.values() if not chunk.is_processed],
-            key=lambda x: x.chunk_id,
-            reverse=True
-        )[:window_size]
-        
-        return sorted(recent_chunks, key=lambda x: x.chunk_id)  # 按时间顺序
+        """获取最近的N个未处理片段用于VAD处理（按时间顺序）"""
+        start_chunk_id = max(self.first_unprocessed_id, self.oldest_chunk_id, self.next_chunk_id - window_size)
+        return [self.chunk_slots[cid % self.capacity] for cid in range(start_chunk_id, self.next_chunk_id)]
+    
+    def mark_processed(self, chunk_id: int):
+        """将 chunk_id 及之前的片段标记为已被VAD消费（推进游标）"""
+        if chunk_id >= self.first_unprocessed_id:
+            self.first_unprocessed_id = chunk_id + 1
     
     def get_chunks_by_range(self, start_chunk_id: int, end_chunk_id: int) -> List[AudioChunk]:
         """获取指定范围内的音频片段"""
-        return [self.chunk_buffer[cid] for cid in range(start_chunk_id, end_chunk_id + 1) 
-                if cid in self.chunk_buffer]
+        start_chunk_id = max(start_chunk_id, self.oldest_chunk_id)
+        end_chunk_id = min(end_chunk_id, self.next_chunk_id - 1)
+        return [self.chunk_slots[cid % self.capacity] for cid in range(start_chunk_id, end_chunk_id + 1)]
+    
+    def get_samples_by_range(self, start_chunk_id: int, end_chunk_id: int,
+                             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        获取指定片段范围内的连续 float32 样本（已归一化到 [-1, 1]）
+        
+        范围未跨越环形缓冲区末尾时直接返回存储的视图（零拷贝），否则拼接两段返回副本；
+        提供 out 时跨越末尾的两段直接拼接写入 out（长度须与范围样本数一致）。
+        """
+        start_chunk_id = max(start_chunk_id, self.oldest_chunk_id)
+        end_chunk_id = min(end_chunk_id, self.next_chunk_id - 1)
+        num_chunks = end_chunk_id - start_chunk_id + 1
+        if num_chunks <= 0:
+            return self.pcm[:0]
+        
+        spc = self.samples_per_chunk
+        start_sample = (start_chunk_id % self.capacity) * spc
+        end_sample = start_sample + num_chunks * spc
+        if end_sample <= len(self.pcm):
+            return self.pcm[start_sample:end_sample]
+        return np.concatenate((self.pcm[start_sample:], self.pcm[:end_sample - len(self.pcm)]), out=out)
     
     def create_speech_segment(self, start_chunk_id: int, start_time: float) -> SpeechSegment:
         """创建新的语音段"""
@@ -78,12 +124,9 @@ class AudioBufferManager:
             # 结束当前段
             self.current_segment.finalize(start_chunk_id - 1, start_time)
             self.speech_segments.append(self.current_segment)
-            
-            # 限制段数量
-            if len(self.speech_segments) > AppConfig.MAX_SPEECH_SEGMENTS:
-                self.speech_segments.pop(0)
         
-        self.current_segment = SpeechSegment(start_chunk_id, start_time)
+        self.current_segment = SpeechSegment(start_chunk_id, start_time, self.next_segment_id)
+        self.next_segment_id += 1
         logger.info(f"🎤 语音段创建，起始片段ID: {start_chunk_id}, 时间: {start_time:.3f}")
         return self.current_segment
     
@@ -95,10 +138,6 @@ class AudioBufferManager:
             self.speech_segments.append(segment)
             self.current_segment = None
             
-            # 限制段数量
-            if len(self.speech_segments) > AppConfig.MAX_SPEECH_SEGMENTS:
-                self.speech_segments.pop(0)
-                
             logger.info(f"✅ 语音段结束，片段范围: {segment.start_chunk_id}-{end_chunk_id}, 时长: {segment.duration:.2f}s")
             return segment
         return None
@@ -113,18 +152,18 @@ class AudioBufferManager:
         
         return self.get_chunks_by_range(start_chunk_id, self.next_chunk_id - 1)
     
-    def get_committed_audio_data(self, segment: SpeechSegment) -> bytes:
-        """获取用于确认转录的完整音频数据"""
+    def get_committed_audio_data(self, segment: SpeechSegment) -> np.ndarray:
+        """获取用于确认转录的完整音频样本（float32 副本，不随环形缓冲区覆盖而变化）"""
         
-        chunks = self.get_chunks_by_range(segment.start_chunk_id, self.next_chunk_id - 1)
-        audio_data = bytearray()
-        for chunk in chunks:
-            audio_data.extend(chunk.audio_data)
-        return bytes(audio_data)
+        # 连续存储上的一次拷贝，无需逐片段拼接
+        return self.get_samples_by_range(segment.start_chunk_id, self.next_chunk_id - 1).copy()
     
     def cleanup(self):
         """清理所有资源"""
-        self.chunk_buffer.clear()
+        self.chunk_slots = [None] * self.capacity
+        self.pcm.fill(0)
+        self.first_chunk_id = self.next_chunk_id
+        self.first_unprocessed_id = self.next_chunk_id
         self.speech_segments.clear()
         self.current_segment = None
         logger.info("🧹 音频缓冲区已清理")
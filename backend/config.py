@@ -1,4 +1,5 @@
 import os
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
 # ======================
@@ -6,39 +7,60 @@ from dotenv import load_dotenv
 # ======================
 load_dotenv()
 
-class AppConfig:
-    """集中管理应用配置"""
-    HOST = os.getenv('HOST', '0.0.0.0')
-    PORT = int(os.getenv('PORT', 8000))
-    CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', './checkpoint')
-    DEVICE = os.getenv('DEVICE', 'cuda')
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'debug').upper()
-    DEBUG_AUDIO_ENABLED = os.getenv('DEBUG_AUDIO_ENABLED', 'false').lower() == 'true'
-    DEBUG_AUDIO_BASE_DIR = os.getenv('DEBUG_AUDIO_BASE_DIR', './debug_audio')
-    USE_HTTPS = os.getenv('USE_HTTPS', 'false').lower() == 'true'
-    SSL_CERT = os.getenv('SSL_CERT', './cert.pem')
-    SSL_KEY = os.getenv('SSL_KEY', './key.pem')
+@dataclass(slots=True)
+class _AppConfig:
+    """集中管理应用配置
+
+    以带 __slots__ 的单例实例提供，属性读取走槽位描述符；
+    未冻结，VAD 参数可在运行时通过 /vad/config 更新。
+    """
+    HOST: str = os.getenv('HOST', '0.0.0.0')
+    PORT: int = int(os.getenv('PORT', 8000))
+    CHECKPOINT_PATH: str = os.getenv('CHECKPOINT_PATH', './checkpoint')
+    DEVICE: str = os.getenv('DEVICE', 'cuda')
+    ASR_MODE: str = os.getenv('ASR_MODE', 'native').lower()  # native / int8 / int4 (int4 仅支持 CUDA)
+    ASR_COMPILE: bool = os.getenv('ASR_COMPILE', 'false').lower() == 'true'  # torch.compile 编译解码循环
+    ASR_ASSISTANT_CHECKPOINT_PATH: str = os.getenv('ASR_ASSISTANT_CHECKPOINT_PATH', '')  # 推测解码草稿模型，留空禁用
+    ASR_STATIC_CACHE_LEN: int = int(os.getenv('ASR_STATIC_CACHE_LEN', 0))  # 预分配静态 KV 缓存长度，0 禁用
+    ASR_PROMPT_LOOKUP_TOKENS: int = int(os.getenv('ASR_PROMPT_LOOKUP_TOKENS', 0))  # 提示查找解码推测长度，0 禁用
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'debug').upper()
+    DEBUG_AUDIO_ENABLED: bool = os.getenv('DEBUG_AUDIO_ENABLED', 'false').lower() == 'true'
+    DEBUG_AUDIO_BASE_DIR: str = os.getenv('DEBUG_AUDIO_BASE_DIR', './debug_audio')
+    USE_HTTPS: bool = os.getenv('USE_HTTPS', 'false').lower() == 'true'
+    SSL_CERT: str = os.getenv('SSL_CERT', './cert.pem')
+    SSL_KEY: str = os.getenv('SSL_KEY', './key.pem')
     # 音频处理配置
-    AUDIO_SAMPLE_RATE = 16000  # 音频采样率，不可修改
-    AUDIO_CHUNK_DURATION_MS = 64  # 64ms音频片段
-    AUDIO_CHUNK_SIZE = int(AUDIO_SAMPLE_RATE * 2 * AUDIO_CHUNK_DURATION_MS / 1000)  # 16kHz, 16-bit, mono
-    MAX_AUDIO_BUFFER_SECONDS = 30  # 最大音频缓冲区30秒
-    MAX_AUDIO_BUFFER_BYTES = int(MAX_AUDIO_BUFFER_SECONDS * 16000 * 4)
+    AUDIO_SAMPLE_RATE: int = 16000  # 音频采样率，不可修改
+    AUDIO_CHUNK_DURATION_MS: int = 64  # 64ms音频片段
+    AUDIO_CHUNK_SIZE: int = int(AUDIO_SAMPLE_RATE * 2 * AUDIO_CHUNK_DURATION_MS / 1000)  # 16kHz, 16-bit, mono
+    MAX_AUDIO_BUFFER_SECONDS: int = 30  # 最大音频缓冲区30秒
+    MAX_AUDIO_BUFFER_BYTES: int = int(MAX_AUDIO_BUFFER_SECONDS * 16000 * 4)
     # VAD配置
-    VAD_SMOOTHING_WINDOW = 2  # VAD平滑窗口大小
-    VAD_SPEECH_THRESHOLD = 0.6  # 语音活动阈值
-    VAD_PROCESS_WINDOW = 10  # 语音活动窗口大小
+    VAD_SMOOTHING_WINDOW: int = 2  # VAD平滑窗口大小
+    VAD_SPEECH_THRESHOLD: float = 0.6  # 语音活动阈值
+    VAD_PROCESS_WINDOW: int = 10  # 语音活动窗口大小
+    VAD_NOISE_FLOOR: float = 0.006  # VAD 噪声底（归一化峰值，约 200/32768），低于该值直接判定为静音，跳过模型
+    VAD_FULL_CHECK_INTERVAL: int = 8  # 噪声底门限连续生效时，每隔多少次检测仍强制运行一次模型
     
     # ====== VAD 动态阈值配置 ======
-    VAD_INITIAL_THRESHOLD = 0.3    # 初始阈值
-    VAD_THRESHOLD_MIN = 0.3        # 最小阈值
-    VAD_THRESHOLD_MAX = 0.9        # 最大阈值
-    VAD_THRESHOLD_STEP = 0.1      # 每次增加的步长
-    VAD_THRESHOLD_DECAY = 0.95     # 指数衰减系数（平滑过渡）
+    VAD_INITIAL_THRESHOLD: float = 0.3    # 初始阈值
+    VAD_THRESHOLD_MIN: float = 0.3        # 最小阈值
+    VAD_THRESHOLD_MAX: float = 0.9        # 最大阈值
+    VAD_THRESHOLD_STEP: float = 0.1      # 每次增加的步长
+    VAD_THRESHOLD_DECAY: float = 0.95     # 指数衰减系数（平滑过渡）
     
     # 转录配置
-    TEMPORARY_TRANSCRIPTION_INTERVAL = 20  # 每20个片段(1.28秒)进行临时转录
-    MAX_SEGMENT_DURATION = 30.0  # 单个语音段最大30秒
+    TEMPORARY_TRANSCRIPTION_INTERVAL: int = 20  # 每20个片段(1.28秒)进行临时转录
+    MAX_SEGMENT_DURATION: float = 30.0  # 单个语音段最大30秒
+    FILE_TRANSCRIBE_BATCH_SIZE: int = int(os.getenv('FILE_TRANSCRIBE_BATCH_SIZE', 8))  # 文件转录时每次 generate() 的最大段数
+    COMMITTED_BATCH_SIZE: int = 4  # 超长语音段拆分后，每次 generate() 批量转录的子段数
+    SILENCE_RMS_THRESHOLD: float = 0.003  # 实时转录静音门限（归一化 RMS，约 -50 dBFS），低于该值不调用模型
+    ASR_MICRO_BATCH_WINDOW_MS: int = int(os.getenv('ASR_MICRO_BATCH_WINDOW_MS', 20))  # 实时转录跨客户端合批的等待窗口（毫秒）
+    ASR_MICRO_BATCH_SIZE: int = int(os.getenv('ASR_MICRO_BATCH_SIZE', 8))  # 实时转录每次 generate() 的最大请求数
+    VAD_USE_GPU: bool = os.getenv('VAD_USE_GPU', 'false').lower() == 'true'  # VAD 模型与 ASR 共用 GPU（DEVICE 为 cuda 且可用时生效）
     # 任务配置
-    VAD_PROCESSING_INTERVAL_MS = AUDIO_CHUNK_DURATION_MS  # VAD处理间隔
-    MAX_SPEECH_SEGMENTS = 3  # 最多同时处理3个语音段
\ No newline at end of file
+    VAD_PROCESSING_INTERVAL_MS: int = AUDIO_CHUNK_DURATION_MS  # VAD处理间隔
+    MAX_SPEECH_SEGMENTS: int = 3  # 最多同时处理3个语音段
+
+
+AppConfig = _AppConfig()
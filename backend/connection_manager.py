@@ -13,9 +13,16 @@ from audio_manager import AudioBufferManager
 from data_basic import AudioChunk, SpeechSegment
 from vad_processor_manager import VADProcessorManager
 from transcription_manager import TranscriptionManager
+from utils import json_dumps
 
 logger = logging.getLogger("speech-to-text")
 
+# 临时转录结果的合并发送间隔（秒）
+TENTATIVE_FLUSH_INTERVAL = 0.1
+
+# 热路径中使用的配置常量，模块加载时计算一次
+_CHUNK_DURATION_S = AppConfig.AUDIO_CHUNK_DURATION_MS / 1000.0
+
 
 # ======================
 # ConnectionManager 
@@ -33,7 +40,9 @@ class ConnectionManager:
         self.vad_task: Optional[asyncio.Task] = None
         self.last_temporary_transcription_time = 0.0
         self.last_chunk_id = -1
-        self.saved_temporary_transcription_text = ""
+        # 临时转录增量队列，由 tentative_flush_task 每 TENTATIVE_FLUSH_INTERVAL 秒合并发送一次
+        self.tentative_queue: asyncio.Queue = asyncio.Queue()
+        self.tentative_flush_task: Optional[asyncio.Task] = None
         
     async def start_vad_processing(self):
         """启动独立的VAD处理任务"""
@@ -43,33 +52,23 @@ class ConnectionManager:
             
         async def vad_loop():
             logger.info(f"🔄 VAD 处理循环开始，客户端: {self.client_id}")
-            last_vad_run = time.time()
             
             while self.is_active:
                 try:
-                    current_time = time.time()
-                    elapsed = current_time - last_vad_run
-                    
-                    # 确保VAD处理不会过于频繁
-                    if elapsed < AppConfig.VAD_PROCESSING_INTERVAL_MS / 1000.0:
-                        await asyncio.sleep((AppConfig.VAD_PROCESSING_INTERVAL_MS / 1000.0) - elapsed)
-                    
-                    last_vad_run = time.time()
-                    
-                    # 处理VAD
-                    state_changed, speech_start_id, speech_end_id = await self.vad_processor.process_vad()
+                    # 处理VAD：缓冲区凑满一个检测窗口时才被唤醒，不再按片段间隔轮询
+                    state_changed, speech_start_id, speech_end_id = await self.vad_processor.accumulate_and_process()
                     
                     user_speaking = self.vad_processor.is_speaking_state()
 
                     if user_speaking:
-                        logger.debug(f"🎙️ VAD 状态: 语音活动, 客户端: {self.client_id}")
+                        logger.debug("🎙️ VAD 状态: 语音活动, 客户端: %s", self.client_id)
                     
                     if state_changed:
                         # 语音开始
                         if speech_start_id is not None and user_speaking:
                             segment = self.buffer_manager.create_speech_segment(
                                 speech_start_id, 
-                                self.buffer_manager.chunk_buffer[speech_start_id].timestamp
+                                self.buffer_manager.get_chunk(speech_start_id).timestamp
                             )
                             logger.info(f"🎤 语音段开始，ID: {speech_start_id}, 客户端: {self.client_id}")
                         
@@ -77,11 +76,10 @@ class ConnectionManager:
                         if speech_end_id is not None and not user_speaking:
                             segment = self.buffer_manager.finalize_current_segment(
                                 speech_end_id,
-                                self.buffer_manager.chunk_buffer[speech_end_id].timestamp
+                                self.buffer_manager.get_chunk(speech_end_id).timestamp
                             )
                             logger.info(f"🎤 语音段结束，ID: {speech_end_id}, 客户端: {self.client_id}")
                             if segment:
-                                self.saved_temporary_transcription_text = ""
                                 await self.process_committed_transcription(segment)
                     
                     # 定期处理临时转录
@@ -98,12 +96,35 @@ class ConnectionManager:
                     logger.info(f"⏹️ VAD 处理循环被取消，客户端: {self.client_id}")
                     break
                 except Exception as e:
-                    logger.error(f"❌ VAD处理循环错误: {str(e)}\n{traceback.format_exc()}, 客户端: {self.client_id}")
+                    logger.error(f"❌ VAD处理循环错误: {str(e)}, 客户端: {self.client_id}", exc_info=True)
                     # 出错后休息更长时间
                     await asyncio.sleep(1.0)
         
         self.vad_task = asyncio.create_task(vad_loop())
+        if self.tentative_flush_task is None or self.tentative_flush_task.done():
+            self.tentative_flush_task = asyncio.create_task(self._tentative_flush_loop())
         logger.info(f"✅ VAD 处理任务已创建，客户端: {self.client_id}")
+
+    async def _tentative_flush_loop(self):
+        """定期将队列中的临时转录增量合并为一条 tentative_batch 消息发送"""
+        try:
+            while self.is_active:
+                await asyncio.sleep(TENTATIVE_FLUSH_INTERVAL)
+                await self._flush_tentative_queue()
+        except asyncio.CancelledError:
+            pass
+
+    async def _flush_tentative_queue(self):
+        """取出队列中全部待发送的临时结果并一次性发送（不在取出后 await，保证顺序）"""
+        items = []
+        while not self.tentative_queue.empty():
+            items.append(self.tentative_queue.get_nowait())
+        if items:
+            await self.send_json({
+                "type": "tentative_batch",
+                "items": items,
+                "client_id": self.client_id
+            })
     
     async def process_audio_chunk(self, audio_data: bytes, debug_audio: Optional[DebugAudioManager] = None):
         """处理单个音频片段"""
@@ -118,10 +139,10 @@ class ConnectionManager:
             
             # 调试：记录处理状态
             if chunk.chunk_id % 5 == 0:  # 每5个片段记录一次
-                logger.debug(f"📊 音频片段 {chunk.chunk_id} 已处理, 缓冲区大小: {len(self.buffer_manager.chunk_buffer)}, 客户端: {self.client_id}")
+                logger.debug("📊 音频片段 %d 已处理, 缓冲区大小: %d, 客户端: %s", chunk.chunk_id, len(self.buffer_manager), self.client_id)
         
         except Exception as e:
-            logger.error(f"❌ 处理音频片段失败: {str(e)}\n{traceback.format_exc()}, 客户端: {self.client_id}")
+            logger.error(f"❌ 处理音频片段失败: {str(e)}, 客户端: {self.client_id}", exc_info=True)
             raise
     
     async def process_temporary_transcription(self):
@@ -135,89 +156,93 @@ class ConnectionManager:
             if not chunks:
                 return
             
-            # 合并音频数据
-            audio_data = b''.join(chunk.audio_data for chunk in chunks)
+            # 从连续存储中取出样本副本（推理在工作线程进行，期间缓冲区可能被覆盖）
+            audio_samples = self.buffer_manager.get_samples_by_range(chunks[0].chunk_id, chunks[-1].chunk_id).copy()
             
             # 执行临时转录
-            transcript = await self.transcription_manager.transcribe_temporary(audio_data)
-            if not transcript:
+            transcript = await self.transcription_manager.transcribe_temporary(audio_samples)
+            if not transcript or not self.buffer_manager.current_segment:
                 return
-            
-            self.saved_temporary_transcription_text += transcript
 
-            # 发送临时结果
+            # 只发送增量文本，由客户端按 segment_id 累积；入队后由刷新任务合并发送
             current_time = time.time()
-            await self.send_json({
+            self.tentative_queue.put_nowait({
                 "type": "tentative_output",
                 "current_text": transcript,
-                "text": self.saved_temporary_transcription_text,
+                "segment_id": self.buffer_manager.current_segment.segment_id,
                 "start_chunk_id": chunks[0].chunk_id,
                 "end_chunk_id": chunks[-1].chunk_id,
-                "duration": len(chunks) * AppConfig.AUDIO_CHUNK_DURATION_MS / 1000.0,
+                "duration": len(chunks) * _CHUNK_DURATION_S,
                 "timestamp": current_time,
                 "client_id": self.client_id,
                 "confidence": "tentative",
                 "processing_delay": current_time - chunks[-1].timestamp
             })
             
-            logger.debug(f"⚡ 临时转录: '{transcript[:50]}...', 片段: {chunks[0].chunk_id}-{chunks[-1].chunk_id}")
+            logger.debug("⚡ 临时转录: '%.50s...', 片段: %d-%d", transcript, chunks[0].chunk_id, chunks[-1].chunk_id)
             
         except Exception as e:
-            logger.error(f"❌ 临时转录处理失败: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"❌ 临时转录处理失败: {str(e)}", exc_info=True)
     
     
     async def process_committed_transcription(self, segment: SpeechSegment):
         """处理确认转录：支持超长音频自动分段转录"""
         try:
-            audio_data = self.buffer_manager.get_committed_audio_data(segment)
-            print(f"audio_data len ： {len(audio_data)}")
+            audio_samples = self.buffer_manager.get_committed_audio_data(segment)
+            logger.debug("audio_samples len ： %d", len(audio_samples))
             
-            if len(audio_data) < AppConfig.AUDIO_CHUNK_SIZE * 2:  # 至少200ms
-                logger.warning(f"⚠️ 音频段太短 ({len(audio_data)} bytes)，跳过确认转录")
+            if len(audio_samples) < AppConfig.AUDIO_CHUNK_SIZE:  # 至少2个片段（200ms）
+                logger.warning(f"⚠️ 音频段太短 ({len(audio_samples)} samples)，跳过确认转录")
                 return
 
             sample_rate = AppConfig.AUDIO_SAMPLE_RATE
-            bytes_per_sec = sample_rate * 2
             max_duration = AppConfig.MAX_SEGMENT_DURATION
-            max_bytes = int(max_duration * bytes_per_sec)
+            max_samples = int(max_duration * sample_rate)
 
             # 计算实际音频时长（用于校验）
-            actual_duration = len(audio_data) / bytes_per_sec
+            actual_duration = len(audio_samples) / sample_rate
             segment_duration = min(actual_duration, segment.duration)  # 以防 metadata 不准
 
+            base = self._committed_payload_base(segment)
+
             # 如果未超限，走原逻辑
             if segment_duration <= max_duration:
-                transcript = await self.transcription_manager.transcribe_committed(audio_data, segment_duration)
+                transcript = await self.transcription_manager.transcribe_committed(audio_samples, segment_duration)
                 if not transcript:
                     logger.warning("⚠️ 确认转录结果为空")
                     return
                 segment.transcript = transcript
                 await self._send_committed_result(
+                    base,
                     transcript=transcript,
-                    segment=segment,
-                    audio_length=len(audio_data),
-                    duration=segment_duration
+                    segment_id=segment.segment_id,
+                    start_time=segment.start_time,
+                    end_time=segment.end_time,
+                    duration=segment_duration,
+                    audio_length=len(audio_samples) * 2  # 保持以 int16 字节数计
                 )
                 logger.info(f"✅ 确认转录成功: '{transcript[:100]}...', 时长: {segment_duration:.2f}s")
                 return
 
             # === 超长处理：分段 ===
             logger.info(f"✂️ 音频段过长 ({segment_duration:.2f}s)，拆分为多个子段（每段≤{max_duration}s）")
-            num_subsegments = math.ceil(len(audio_data) / max_bytes)
+            num_subsegments = math.ceil(len(audio_samples) / max_samples)
             sub_results: List[Tuple[str, float, float]] = []  # (text, start, end)
 
-            for i in range(num_subsegments):
-                start_byte = i * max_bytes
-                end_byte = min(start_byte + max_bytes, len(audio_data))
-                sub_audio = audio_data[start_byte:end_byte]
-                sub_duration = len(sub_audio) / bytes_per_sec
+            sub_audios = [
+                audio_samples[i * max_samples:(i + 1) * max_samples]
+                for i in range(num_subsegments)
+            ]
+            sub_durations = [len(sub_audio) / sample_rate for sub_audio in sub_audios]
+
+            # 所有子段相互独立，批量送入模型一次生成
+            transcripts = await self.transcription_manager.transcribe_committed_batch(sub_audios, sub_durations)
 
+            for i, (sub_audio, sub_duration, transcript) in enumerate(zip(sub_audios, sub_durations, transcripts)):
                 # 计算子段的时间戳（基于原始 segment 的 start_time）
                 sub_start_time = segment.start_time + i * max_duration
                 sub_end_time = sub_start_time + sub_duration
 
-                # 转录子段
-                transcript = await self.transcription_manager.transcribe_committed(sub_audio, sub_duration)
                 if not transcript:
                     logger.warning(f"⚠️ 子段 {i+1}/{num_subsegments} 转录结果为空")
                     # 仍继续处理其他片段，不中断
@@ -225,13 +250,13 @@ class ConnectionManager:
 
                 # 发送子段结果
                 await self._send_committed_result(
+                    base,
                     transcript=transcript,
-                    segment=segment,
-                    audio_length=len(sub_audio),
+                    segment_id=f"{segment.segment_id}_part_{i+1}",
+                    start_time=sub_start_time,
+                    end_time=sub_end_time,
                     duration=sub_duration,
-                    custom_start_time=sub_start_time,
-                    custom_end_time=sub_end_time,
-                    suffix=f"_part_{i+1}"
+                    audio_length=len(sub_audio) * 2
                 )
                 sub_results.append((transcript, sub_start_time, sub_end_time))
 
@@ -242,36 +267,40 @@ class ConnectionManager:
             logger.info(f"✅ 超长音频分段转录完成 ({len(sub_results)} 段)，总文本: '{full_transcript[:100]}...'")
 
         except Exception as e:
-            logger.error(f"❌ 确认转录处理失败: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"❌ 确认转录处理失败: {str(e)}", exc_info=True)
+
+    def _committed_payload_base(self, segment: SpeechSegment) -> dict:
+        """同一语音段各子段共用的确认结果字段，每段只构建一次"""
+        return {
+            "type": "committed_output",
+            "start_chunk_id": segment.start_chunk_id,
+            "end_chunk_id": segment.end_chunk_id,
+            "client_id": self.client_id,
+            "confidence": "high",
+        }
 
     async def _send_committed_result(
         self,
+        base: dict,
         transcript: str,
-        segment: SpeechSegment,
-        audio_length: int,
+        segment_id,
+        start_time: float,
+        end_time: float,
         duration: float,
-        custom_start_time: float = None,
-        custom_end_time: float = None,
-        suffix: str = ""
+        audio_length: int
     ):
-        """复用发送逻辑"""
-        start_time = custom_start_time if custom_start_time is not None else segment.start_time
-        end_time = custom_end_time if custom_end_time is not None else segment.end_time
-        seg_id = f"{id(segment)}{suffix}" if suffix else id(segment)
+        """在公共字段基础上补充本次结果并发送"""
+        # 先发出尚未刷新的临时结果，避免其晚于确认结果到达客户端
+        await self._flush_tentative_queue()
 
-        current_time = time.time()
         await self.send_json({
-            "type": "committed_output",
+            **base,
             "text": transcript,
-            "segment_id": seg_id,
-            "start_chunk_id": segment.start_chunk_id,
-            "end_chunk_id": segment.end_chunk_id,
+            "segment_id": segment_id,
             "start_time": start_time,
             "end_time": end_time,
             "duration": duration,
-            "timestamp": current_time,
-            "client_id": self.client_id,
-            "confidence": "high",
+            "timestamp": time.time(),
             "audio_length": audio_length
         })
     
@@ -279,7 +308,8 @@ class ConnectionManager:
         """安全发送JSON消息"""
         try:
             if self.websocket.client_state != WebSocketState.DISCONNECTED:
-                await self.websocket.send_json(data)
+                # 前端按文本帧 JSON.parse，这里保持 text 帧，仅替换序列化实现
+                await self.websocket.send_text(json_dumps(data).decode())
         except Exception as e:
             logger.warning(f"⚠️ 消息发送失败 (客户端: {self.client_id}): {str(e)}")
             self.is_active = False
@@ -295,6 +325,9 @@ class ConnectionManager:
             except:
                 pass
         
+        if self.tentative_flush_task:
+            self.tentative_flush_task.cancel()
+        
         # 清理缓冲区
         self.buffer_manager.cleanup()
         
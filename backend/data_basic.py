@@ -1,25 +1,31 @@
 import os
 import time
 import logging
-from typing import Optional
+from typing import Optional, List
+import numpy as np
+from config import AppConfig
 
 logger = logging.getLogger("speech-to-text")
 
+_CHUNK_DURATION_S = AppConfig.AUDIO_CHUNK_DURATION_MS / 1000.0
+
 # ======================
 # 音频片段和语音段管理
 # ======================
 class AudioChunk:
     """音频片段数据结构"""
-    def __init__(self, chunk_id: int, timestamp: float, audio_data: bytes):
+    __slots__ = ('chunk_id', 'timestamp', 'audio_data', 'vad_confidence', 'is_processed')
+    
+    def __init__(self, chunk_id: int, timestamp: float, audio_data: np.ndarray):
         self.chunk_id = chunk_id
         self.timestamp = timestamp  # 片段开始时间戳
-        self.audio_data = audio_data
+        self.audio_data = audio_data  # 归一化的 float32 样本（AudioBufferManager 连续存储中的视图，片段被淘汰后样本会被新数据覆盖）
         self.vad_confidence = 0.0
         self.is_processed = False
-        
+    
     @property
     def duration(self) -> float:
-        return AppConfig.AUDIO_CHUNK_DURATION_MS / 1000.0
+        return _CHUNK_DURATION_S
     
     def to_dict(self) -> dict:
         return {
@@ -32,26 +38,34 @@ class AudioChunk:
 
 class SpeechSegment:
     """语音段数据结构"""
-    def __init__(self, start_chunk_id: int, start_time: float):
+    __slots__ = (
+        'segment_id', 'start_chunk_id', 'start_time', 'end_chunk_id', 'end_time', 'audio_data',
+        'transcript', 'temporary_transcripts', 'is_final', 'created_at', '_duration'
+    )
+    
+    def __init__(self, start_chunk_id: int, start_time: float, segment_id: int = -1):
+        self.segment_id = segment_id  # 连接内单调递增的语音段编号
         self.start_chunk_id = start_chunk_id
         self.start_time = start_time
         self.end_chunk_id = -1
         self.end_time = -1.0
-        self.audio_data = bytearray()
+        self.audio_data = bytearray()  # 16kHz 单声道 16-bit 小端 PCM（int16）字节，格式与客户端上传的原始数据一致
         self.transcript = ""
         self.temporary_transcripts: List[str] = []
         self.is_final = False
         self.created_at = time.time()
+        self._duration = 0.0  # 结束后固定的时长，finalize() 时写入
         
     @property
     def duration(self) -> float:
-        if self.end_time <= 0:
-            return time.time() - self.start_time
-        return self.end_time - self.start_time
+        if self.is_final:
+            return self._duration
+        return time.time() - self.start_time
         
     def add_chunk(self, chunk: AudioChunk):
-        """添加音频片段到语音段"""
-        self.audio_data.extend(chunk.audio_data)
+        """添加音频片段到语音段（片段的归一化 float32 样本还原为 int16 PCM 字节后追加）"""
+        pcm = np.clip(chunk.audio_data * 32768.0, -32768, 32767).astype('<i2')
+        self.audio_data.extend(pcm.tobytes())
         if not self.is_final:
             chunk.is_processed = True
         
@@ -59,6 +73,7 @@ class SpeechSegment:
         """结束语音段"""
         self.end_chunk_id = end_chunk_id
         self.end_time = end_time
+        self._duration = end_time - self.start_time
         self.is_final = True
         
     def to_dict(self) -> dict:
@@ -71,6 +86,6 @@ class SpeechSegment:
             "transcript": self.transcript,
             "temporary_transcripts": self.temporary_transcripts,
             "is_final": self.is_final,
-            "segment_id": id(self)
+            "segment_id": self.segment_id
         }
 
@@ -2,12 +2,17 @@
 import os
 from config import AppConfig
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
 import traceback
 import wave
 
 logger = logging.getLogger("speech-to-text")
 
+DEBUG_AUDIO_QUEUE_SIZE = 256  # 待写入帧队列上限，写盘跟不上时丢弃新帧
+DEBUG_AUDIO_MAX_COALESCE = 32  # 单次 writeframes 最多合并的帧数
+
 # ======================
 # 调试音频管理
 # ======================
@@ -19,6 +24,11 @@ class DebugAudioManager:
         self.audio_path = ""
         self.writer: Optional[wave.Wave_write] = None
         self.session_dir = ""
+        # 文件 I/O 全部在单线程执行器中串行完成，不阻塞事件循环
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dropped_frames = 0
         
     def __enter__(self) -> Optional['DebugAudioManager']:
         """创建调试音频文件"""
@@ -38,23 +48,79 @@ class DebugAudioManager:
             self.writer.setnchannels(1)   # 单声道
             self.writer.setsampwidth(2)   # 16-bit
             self.writer.setframerate(16000)  # 16kHz
+            self._queue = asyncio.Queue(maxsize=DEBUG_AUDIO_QUEUE_SIZE)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-audio")
+            self._task = asyncio.get_running_loop().create_task(self._drain())
             logger.info(f"🎧 调试音频已启用，保存到: {self.audio_path}")
             return self
         except Exception as e:
             logger.error(f"❌ 初始化调试音频失败: {str(e)}\n{traceback.format_exc()}")
-            self.cleanup()
+            # 初始化失败时写入协程尚未启动，同步释放已创建的资源即可
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self._close_writer()
             return None
             
     def write(self, audio_data: bytes):
-        """写入音频数据"""
-        if self.writer:
+        """将音频数据放入写入队列（队列满时丢弃，优先保证实时处理）"""
+        if not self.writer or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(audio_data)
+        except asyncio.QueueFull:
+            self._dropped_frames += 1
+            if self._dropped_frames == 1:
+                logger.warning(f"⚠️ 调试音频写入队列已满，开始丢弃帧: {self.client_id}")
+    
+    async def _drain(self):
+        """后台写入协程：合并队列中的多帧后一次性写盘，取到结束标记 None 时写完已取出的帧后退出"""
+        loop = asyncio.get_running_loop()
+        queue = self._queue  # cleanup() 会先将 self._queue 置空，这里持有自己的引用
+        finished = False
+        while not finished:
+            frame = await queue.get()
+            if frame is None:
+                return
+            frames = [frame]
+            while len(frames) < DEBUG_AUDIO_MAX_COALESCE and not queue.empty():
+                frame = queue.get_nowait()
+                if frame is None:
+                    finished = True
+                    break
+                frames.append(frame)
+            await loop.run_in_executor(self._executor, self._write_frames, b"".join(frames))
+    
+    def _write_frames(self, data: bytes):
+        """在执行器线程中写入音频帧"""
+        try:
+            if self.writer:
+                self.writer.writeframes(data)
+        except Exception as e:
+            logger.error(f"❌ 写入调试音频失败: {str(e)}")
+    
+    async def cleanup(self):
+        """清理调试音频资源（等待队列中的帧全部写盘后关闭文件，不阻塞事件循环）"""
+        if self._task:
+            # 放入结束标记并等待写入协程自然退出，已入队的帧不会丢失；
+            # 先断开 write() 的入队入口，写入协程已异常退出时不再等待队列空位
+            queue, self._queue = self._queue, None
+            if not self._task.done():
+                await queue.put(None)
             try:
-                self.writer.writeframes(audio_data)
+                await self._task
             except Exception as e:
-                logger.error(f"❌ 写入调试音频失败: {str(e)}")
+                logger.error(f"❌ 调试音频写入协程异常退出: {str(e)}")
+            self._task = None
+        if self._executor:
+            await asyncio.to_thread(self._executor.shutdown, True)
+            self._executor = None
+            if self._dropped_frames:
+                logger.warning(f"⚠️ 调试音频共丢弃 {self._dropped_frames} 帧: {self.client_id}")
+        await asyncio.to_thread(self._close_writer)
     
-    def cleanup(self):
-        """清理调试音频资源"""
+    def _close_writer(self):
+        """关闭 WAV 文件并清理空文件/目录"""
         if self.writer:
             try:
                 self.writer.close()
@@ -1,9 +1,12 @@
 import os
 import time
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, AsyncGenerator, List, Tuple, Deque, Union
 import asyncio
 import json
+import math
+import functools
 import logging
 import traceback
 import wave
@@ -13,7 +16,7 @@ from collections import deque
 import uvicorn
 from fastapi import FastAPI, UploadFile, File, WebSocket, HTTPException, Query, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel, Field
 from asr import ASRModel
 from vad import VADProcessor
@@ -21,12 +24,18 @@ from vad_processor_manager import VADProcessorManager
 from config import AppConfig
 from debug import DebugAudioManager
 from connection_manager import ConnectionManager, SpeechSegment, AudioChunk, AudioBufferManager
-from utils import convert_audio_to_wav, audiosegment_to_tensor, standardize_audio_tensor
+from utils import convert_audio_to_wav, audiosegment_to_tensor, decode_audio_to_tensor, standardize_audio_tensor, json_dumps, json_loads
 from dotenv import load_dotenv
-from models_manager import asr_model_init, vad_model_init, asr_model_get, vad_model_get
+from models_manager import asr_model_init, vad_model_init, asr_model_get, vad_model_get, vad_device
 from starlette.websockets import WebSocketDisconnect, WebSocketState
 import fastapi_cdn_host
 
+try:
+    import uvloop  # noqa: F401
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
 # 配置日志
 logging.basicConfig(
     level=getattr(logging, AppConfig.LOG_LEVEL),
@@ -39,6 +48,13 @@ logger = logging.getLogger("speech-to-text")
 # ======================
 asr_model: Optional[ASRModel] = None
 vad_processor: Optional[VADProcessor] = None
+# 文件转录的整段 VAD 使用独立的模型实例和单线程执行器：
+# Silero VAD 带有循环状态，不能与实时连接共享的实例并发运行，也不占用 ASR 使用的执行器
+file_vad_processor: Optional[VADProcessor] = None
+file_vad_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-vad")
+# 文件转录的 ASR 推理使用专用的小型执行器，限制并发的 GPU 推理线程数，
+# 避免与默认执行器中的其他阻塞任务争抢线程和 GIL
+asr_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asr")
 
 # ======================
 # 生命周期管理
@@ -57,11 +73,12 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
 
 async def _init_models():
     """初始化ASR和VAD模型"""
-    global asr_model, vad_processor
+    global asr_model, vad_processor, file_vad_processor
     try:
         logger.info("🔊 加载 VAD 处理器...")
         vad_model_init()
         vad_processor = vad_model_get()
+        file_vad_processor = VADProcessor(device=vad_device())
         logger.info("✅ VAD 处理器加载成功")
         logger.info(f"🧠 加载 ASR 模型，路径: {AppConfig.CHECKPOINT_PATH}, 设备: {AppConfig.DEVICE}")
         asr_model_init()
@@ -80,13 +97,16 @@ def _init_debug_directory():
 async def _cleanup_resources():
     """清理资源"""
     logger.info("🧹 应用关闭，清理资源...")
-    global asr_model, vad_processor
+    global asr_model, vad_processor, file_vad_processor
+    file_vad_executor.shutdown(wait=False, cancel_futures=True)
+    asr_executor.shutdown(wait=False, cancel_futures=True)
     if asr_model and hasattr(asr_model, 'model'):
         logger.info("🗑️ 释放 ASR 模型内存...")
         del asr_model.model
         torch.cuda.empty_cache()
         asr_model = None
     vad_processor = None
+    file_vad_processor = None
     logger.info("✅ 资源清理完成")
 
 # ======================
@@ -147,31 +167,33 @@ app.add_middleware(
 # API 端点
 # ======================
 
-@app.get("/health")
-async def health_check():
-    """健康检查接口"""
-    return {
+# 响应体按其中可变的状态（模型是否加载、运行时可改的 VAD 参数）缓存为预序列化字节
+
+@functools.lru_cache(maxsize=8)
+def _health_payload_prefix(asr_loaded: bool, vad_loaded: bool, vad_smoothing_window: int) -> bytes:
+    """健康检查响应中除 timestamp 外的部分（末尾留出 timestamp 字段位置）"""
+    payload = json_dumps({
         "status": "ok",
         "service": "speech-to-text",
         "version": "2.1.0",
-        "timestamp": time.time(),
         "models": {
-            "asr_loaded": asr_model is not None,
-            "vad_loaded": vad_processor is not None
+            "asr_loaded": asr_loaded,
+            "vad_loaded": vad_loaded
         },
         "configuration": {
             "default_max_segment_duration": AppConfig.MAX_SEGMENT_DURATION,
             "audio_chunk_duration_ms": AppConfig.AUDIO_CHUNK_DURATION_MS,
-            "vad_smoothing_window": AppConfig.VAD_SMOOTHING_WINDOW,
+            "vad_smoothing_window": vad_smoothing_window,
             "max_audio_buffer_seconds": AppConfig.MAX_AUDIO_BUFFER_SECONDS,
             "temporary_transcription_interval": AppConfig.TEMPORARY_TRANSCRIPTION_INTERVAL
         }
-    }
+    })
+    return payload[:-1] + b',"timestamp":'
 
-@app.get("/debug/config")
-async def get_config():
-    """获取当前配置信息"""
-    return {
+@functools.lru_cache(maxsize=8)
+def _config_payload(vad_smoothing_window: int, vad_speech_threshold: float) -> bytes:
+    """配置信息响应体"""
+    return json_dumps({
         "api_base_url": f"http://{AppConfig.HOST}:{AppConfig.PORT}",
         "websocket_url": f"ws://{AppConfig.HOST}:{AppConfig.PORT}/ws/audio",
         "audio_processing": {
@@ -180,15 +202,29 @@ async def get_config():
             "max_buffer_seconds": AppConfig.MAX_AUDIO_BUFFER_SECONDS
         },
         "vad_configuration": {
-            "smoothing_window": AppConfig.VAD_SMOOTHING_WINDOW,
-            "speech_threshold": AppConfig.VAD_SPEECH_THRESHOLD,
+            "smoothing_window": vad_smoothing_window,
+            "speech_threshold": vad_speech_threshold,
             "processing_interval_ms": AppConfig.VAD_PROCESSING_INTERVAL_MS
         },
         "transcription_configuration": {
             "default_max_segment_duration": AppConfig.MAX_SEGMENT_DURATION,
             "temporary_interval_chunks": AppConfig.TEMPORARY_TRANSCRIPTION_INTERVAL,
         }
-    }
+    })
+
+@app.get("/health")
+async def health_check():
+    """健康检查接口"""
+    prefix = _health_payload_prefix(asr_model is not None, vad_processor is not None, AppConfig.VAD_SMOOTHING_WINDOW)
+    return Response(prefix + json_dumps(time.time()) + b"}", media_type="application/json")
+
+@app.get("/debug/config")
+async def get_config():
+    """获取当前配置信息"""
+    return Response(
+        _config_payload(AppConfig.VAD_SMOOTHING_WINDOW, AppConfig.VAD_SPEECH_THRESHOLD),
+        media_type="application/json"
+    )
 
 @app.post("/transcribe/file")
 async def transcribe_file(
@@ -238,8 +274,9 @@ async def transcribe_file(
                 f"最大段时长: {effective_max_segment_duration}s")
 
     try:
-        logger.info(f"📁 处理文件上传: {file.filename}, 大小: {file.size} bytes")
-        file_content = await file.read()
+        # 上传已由 Starlette 写入 SpooledTemporaryFile（超过阈值即落盘），不再整体读入内存
+        file_size = file.file.seek(0, os.SEEK_END)
+        logger.info(f"📁 处理文件上传: {file.filename}, 大小: {file_size} bytes")
         logger.info("🔄 转换音频格式...")
         
         # 从内存直接处理，避免临时文件 I/O
@@ -250,14 +287,18 @@ async def transcribe_file(
         
         # 先获取完整音频用于 VAD 和分段
         try:
-            # 使用内存中的音频数据
-            audio = convert_audio_to_wav(file_content, file.filename)
-            full_audio_tensor = audiosegment_to_tensor(audio)
+            # 优先用 soundfile 直接解码为 float32；其不支持的格式回退到 pydub/ffmpeg
+            full_audio_tensor = decode_audio_to_tensor(file.file, AppConfig.AUDIO_SAMPLE_RATE)
+            if full_audio_tensor is None:
+                await file.seek(0)
+                audio = convert_audio_to_wav(await file.read(), file.filename)
+                full_audio_tensor = audiosegment_to_tensor(audio)
             full_audio_tensor = standardize_audio_tensor(full_audio_tensor)
             
-            # 确保是 1D 张量
+            # 确保是连续的 1D 张量，各段直接取其视图
             if full_audio_tensor.ndim > 1:
                 full_audio_tensor = full_audio_tensor.squeeze()
+            full_audio_tensor = full_audio_tensor.contiguous()
             
             total_samples = full_audio_tensor.shape[0]
             sample_rate = AppConfig.AUDIO_SAMPLE_RATE
@@ -276,38 +317,22 @@ async def transcribe_file(
             # 预分割模式：不使用VAD，直接按固定时长分割
             if not config.vad_enabled:
                 logger.info(f"⚡ 预分割模式启用，最大段时长: {effective_max_segment_duration}s")
-                return [{
-                    'original_index': 1,
-                    'start_sample': 0,
-                    'end_sample': total_samples,
-                    'start_time': 0.0,
-                    'end_time': total_duration,
-                    'duration': total_duration,
-                    'is_long_segment': total_duration > effective_max_segment_duration
-                }]
+                return [_whole_audio_segment(total_samples, total_duration, effective_max_segment_duration)]
             
             # VAD模式：检测语音活动
             if total_duration < 1.0:  # 短音频不 VAD
                 logger.info("⚡ 短音频，跳过VAD检测")
-                return [{
-                    'original_index': 1,
-                    'start_sample': 0,
-                    'end_sample': total_samples,
-                    'start_time': 0.0,
-                    'end_time': total_duration,
-                    'duration': total_duration,
-                    'is_long_segment': total_duration > effective_max_segment_duration
-                }]
+                return [_whole_audio_segment(total_samples, total_duration, effective_max_segment_duration)]
             
             try:
                 logger.info("⚡ 异步 VAD 检测中...")
                 vad_start_time = time.time()
                 
-                # 在后台线程执行 CPU 密集型 VAD 操作
-                loop = asyncio.get_event_loop()
+                # 在专用 VAD 线程执行 CPU 密集型 VAD 操作
+                loop = asyncio.get_running_loop()
                 speech_timestamps, has_speech = await loop.run_in_executor(
-                    None, 
-                    lambda: vad_processor.detect_voice_activity(
+                    file_vad_executor, 
+                    lambda: file_vad_processor.detect_voice_activity(
                         full_audio_tensor.unsqueeze(0),  # 确保维度正确
                         threshold=AppConfig.VAD_SPEECH_THRESHOLD
                     )
@@ -317,50 +342,40 @@ async def transcribe_file(
                 logger.info(f"⚡ VAD 检测完成，耗时: {vad_time:.2f}s")
                 
                 if has_speech and speech_timestamps:
-                    segments = []
-                    for idx, ts in enumerate(speech_timestamps):
-                        start_sample = max(0, min(ts['start'], total_samples - 1))
-                        end_sample = max(start_sample + 100, min(ts['end'], total_samples))
-                        duration = (end_sample - start_sample) / sample_rate
-                        
-                        if duration > 0.1:  # 跳过过短段
-                            segments.append({
-                                'original_index': idx + 1,
-                                'start_sample': start_sample,
-                                'end_sample': end_sample,
-                                'start_time': start_sample / sample_rate,
-                                'end_time': end_sample / sample_rate,
-                                'duration': duration,
-                                'is_long_segment': duration > effective_max_segment_duration
-                            })
+                    # 一次性向量化完成边界裁剪与过短段过滤
+                    bounds = np.array([(ts['start'], ts['end']) for ts in speech_timestamps], dtype=np.int64)
+                    start_samples = np.clip(bounds[:, 0], 0, total_samples - 1)
+                    end_samples = np.maximum(start_samples + 100, np.minimum(bounds[:, 1], total_samples))
+                    durations = (end_samples - start_samples) / sample_rate
+                    keep = np.flatnonzero(durations > 0.1)  # 跳过过短段
+                    
+                    segments = [
+                        {
+                            'original_index': idx + 1,
+                            'start_sample': start_sample,
+                            'end_sample': end_sample,
+                            'start_time': start_sample / sample_rate,
+                            'end_time': end_sample / sample_rate,
+                            'duration': duration,
+                            'is_long_segment': duration > effective_max_segment_duration
+                        }
+                        for idx, start_sample, end_sample, duration in zip(
+                            keep.tolist(), start_samples[keep].tolist(),
+                            end_samples[keep].tolist(), durations[keep].tolist()
+                        )
+                    ]
                     
                     if segments:
                         logger.info(f"✅ 检测到 {len(segments)} 个有效语音段")
                         return segments
                 
                 logger.warning("🔇 VAD 未检测到有效语音，使用整个音频")
-                return [{
-                    'original_index': 1,
-                    'start_sample': 0,
-                    'end_sample': total_samples,
-                    'start_time': 0.0,
-                    'end_time': total_duration,
-                    'duration': total_duration,
-                    'is_long_segment': total_duration > effective_max_segment_duration
-                }]
+                return [_whole_audio_segment(total_samples, total_duration, effective_max_segment_duration)]
                 
             except Exception as e:
                 logger.error(f"❌ VAD 处理失败: {str(e)}\n{traceback.format_exc()}")
                 logger.warning("🔇 VAD 失败，回退到整个音频")
-                return [{
-                    'original_index': 1,
-                    'start_sample': 0,
-                    'end_sample': total_samples,
-                    'start_time': 0.0,
-                    'end_time': total_duration,
-                    'duration': total_duration,
-                    'is_long_segment': total_duration > effective_max_segment_duration
-                }]
+                return [_whole_audio_segment(total_samples, total_duration, effective_max_segment_duration)]
         
         # === 优化3: 尽快返回段信息，后台处理转录 ===
         raw_segments = await get_segments()
@@ -381,15 +396,23 @@ async def transcribe_file(
         total_segments = len(final_segments)
         logger.info(f"🎯 最终处理 {total_segments} 个语音段")
         
+        # 段摘要只在流式响应中发送（非流式结果只保留 segment_result），在此一次性构建
+        summary_message = {
+            "type": "segments_summary",
+            "segments": get_segments_summary(final_segments, sample_rate),
+            "total_segments": total_segments,
+            "timestamp": time.time()
+        } if stream else None
+        
         # === 优化4: 立即返回段信息，转录在后台进行 ===
         async def transcribe_generator():
-            """生成器：快速返回段信息，后台异步转录"""
+            """生成器：快速返回段信息（消息字典），后台异步转录"""
             
             # 立即发送初始化信息
             init_message = {
                 "type": "initialization",
                 "filename": file.filename,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "total_duration": round(total_duration, 2),
                 "total_segments": total_segments,
                 "config": {
@@ -399,55 +422,54 @@ async def transcribe_file(
                 },
                 "timestamp": time.time()
             }
-            yield (json.dumps(init_message, ensure_ascii=False) + "\n").encode("utf-8")
+            yield init_message
             
             # 立即发送段摘要（不等待转录）
-            segments_summary = get_segments_summary(final_segments, sample_rate)
-            
-            summary_message = {
-                "type": "segments_summary",
-                "segments": segments_summary,
-                "total_segments": total_segments,
-                "timestamp": time.time()
-            }
-            yield (json.dumps(summary_message, ensure_ascii=False) + "\n").encode("utf-8")
+            if summary_message is not None:
+                yield summary_message
             
-            # 异步转录任务队列
-            transcription_tasks = []
             successful_segments = 0
             failed_segments = 0
             
-            # 创建转录任务（不立即执行）
-            for segment in final_segments:
-                task = {
-                    'segment': segment,
-                    'future': None
-                }
-                transcription_tasks.append(task)
-            
-            # 使用信号量控制并发
-            MAX_CONCURRENT_TRANSCRIPTIONS = 3  # 根据 GPU 能力调整
-            semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
-            
-            async def transcribe_segment(task):
-                async with semaphore:
-                    segment = task['segment']
-                    return await transcribe_single_segment(
-                        segment, 
-                        full_audio_tensor, 
-                        sample_rate,
-                        hotwords=config.hotwords,
-                        max_new_tokens=256  # 可根据需要调整
-                    )
+            # 按时长分桶组批，每批一次 generate()
+            batch_queue: asyncio.Queue = asyncio.Queue()
+            for batch in bucket_segments(final_segments, AppConfig.FILE_TRANSCRIBE_BATCH_SIZE):
+                batch_queue.put_nowait(batch)
+            result_queue: asyncio.Queue = asyncio.Queue()
             
-            # 启动所有转录任务
-            for task in transcription_tasks:
-                task['future'] = asyncio.create_task(transcribe_segment(task))
+            async def batch_worker():
+                """固定数量的工作协程依次领取批次，存活任务数不随段数增长"""
+                while not batch_queue.empty():
+                    batch = batch_queue.get_nowait()
+                    # 每个段都必须投递结果或错误对象，否则按序输出的循环会一直等待，请求挂起
+                    try:
+                        results = await transcribe_segment_batch(
+                            batch, 
+                            full_audio_tensor, 
+                            sample_rate,
+                            hotwords=config.hotwords,
+                            max_new_tokens=256  # 可根据需要调整
+                        )
+                        if len(results) != len(batch):
+                            raise RuntimeError(f"批量转录返回 {len(results)} 个结果，期望 {len(batch)} 个")
+                        items = [(segment['segment_index'], result) for segment, result in zip(batch, results)]
+                    except Exception as e:
+                        logger.error(f"❌ 段转录任务失败: {str(e)}", exc_info=True)
+                        items = [(segment['segment_index'], _segment_error(segment, str(e))) for segment in batch]
+                    for item in items:
+                        result_queue.put_nowait(item)
             
-            # 按顺序收集结果（显示更有序）
-            for task in transcription_tasks:
-                try:
-                    result = await task['future']
+            workers = [asyncio.create_task(batch_worker()) for _ in range(MAX_CONCURRENT_TRANSCRIPTION_BATCHES)]
+            try:
+                # 按段顺序输出结果（显示更有序），先完成的后续段暂存
+                pending_results = {}
+                for segment in final_segments:
+                    segment_index = segment['segment_index']
+                    while segment_index not in pending_results:
+                        index, result = await result_queue.get()
+                        pending_results[index] = result
+                    result = pending_results.pop(segment_index)
+                    
                     if result.get('type') == 'segment_result':
                         successful_segments += 1
                     else:
@@ -457,15 +479,11 @@ async def transcribe_file(
                     progress = round((successful_segments + failed_segments) / total_segments * 100, 1)
                     result['progress'] = progress
                     
-                    yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
-                    
-                    # 小延迟，避免前端过载
-                    if total_segments > 5:
-                        await asyncio.sleep(0.01)
-                    
-                except Exception as e:
-                    logger.error(f"❌ 段转录任务失败: {str(e)}")
-                    failed_segments += 1
+                    yield result
+            finally:
+                # 客户端中途断开时停止剩余批次
+                for worker in workers:
+                    worker.cancel()
             
             # 发送最终汇总
             final_summary = {
@@ -480,12 +498,16 @@ async def transcribe_file(
                 "hotwords_used": config.hotwords or [],
                 "vad_enabled": config.vad_enabled
             }
-            yield (json.dumps(final_summary, ensure_ascii=False) + "\n").encode("utf-8")
+            yield final_summary
         
         if stream:
             logger.info("⚡ 启用流式响应，立即返回段信息")
+            async def ndjson_stream():
+                async for message in transcribe_generator():
+                    yield json_dumps(message) + b"\n"
+            
             return StreamingResponse(
-                transcribe_generator(),
+                ndjson_stream(),
                 media_type="application/x-ndjson",
                 headers={
                     "X-Content-Type-Options": "nosniff",
@@ -495,15 +517,13 @@ async def transcribe_file(
             )
         else:
             # 非流式处理（保持兼容）
-            results = []
-            async for chunk in transcribe_generator():
-                results.append(json.loads(chunk.decode("utf-8").strip()))
+            results = [message async for message in transcribe_generator()]
             
             segments_result = [r for r in results if r.get("type") == "segment_result"]
             return {
                 "status": "completed",
                 "filename": file.filename,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "total_duration": round(total_duration, 2),
                 "config": {
                     "vad_enabled": config.vad_enabled,
@@ -524,16 +544,54 @@ async def transcribe_file(
 
 # === 辅助方法 ===
 
+def _whole_audio_segment(total_samples, total_duration, max_segment_duration):
+    """整段音频作为单个语音段（预分割模式、短音频、VAD 无结果或失败时使用）"""
+    return {
+        'original_index': 1,
+        'start_sample': 0,
+        'end_sample': total_samples,
+        'start_time': 0.0,
+        'end_time': total_duration,
+        'duration': total_duration,
+        'is_long_segment': total_duration > max_segment_duration
+    }
+
 def cut_long_segments(raw_segments, sample_rate, total_samples, total_duration, max_segment_duration):
-    """切割长音频段，使用指定的最大段时长"""
-    final_segments = []
+    """切割长音频段，使用指定的最大段时长（所有段的子段边界一次性向量化计算）"""
+    if not raw_segments:
+        return []
     
-    for raw_segment in raw_segments:
-        duration = raw_segment['duration']
-        start_sample = raw_segment['start_sample']
-        end_sample = raw_segment['end_sample']
-        
-        if duration <= max_segment_duration:
+    start_samples = np.array([s['start_sample'] for s in raw_segments], dtype=np.int64)
+    end_samples = np.array([s['end_sample'] for s in raw_segments], dtype=np.int64)
+    durations = np.array([s['duration'] for s in raw_segments], dtype=np.float64)
+    samples_per_sub_segment = int(max_segment_duration * sample_rate)
+    
+    # 每个原始段拆分出的子段数（未超长的段为 1）
+    is_long = durations > max_segment_duration
+    counts = np.where(is_long, np.ceil(durations / max_segment_duration), 1).astype(np.int64)
+    
+    # 展开为子段：所属原始段索引 + 段内子段序号
+    seg_idx = np.repeat(np.arange(len(raw_segments)), counts)
+    sub_idx = np.arange(len(seg_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    sub_is_long = is_long[seg_idx]
+    
+    sub_start = start_samples[seg_idx] + sub_idx * samples_per_sub_segment
+    sub_end = np.where(
+        sub_is_long,
+        np.minimum(np.minimum(sub_start + samples_per_sub_segment, end_samples[seg_idx]), total_samples),
+        end_samples[seg_idx]
+    )
+    sub_duration = np.where(sub_is_long, (sub_end - sub_start) / sample_rate, durations[seg_idx])
+    keep = ~sub_is_long | (sub_duration > 0.1)  # 跳过过短的切割子段
+    
+    final_segments = []
+    for i, sub, long, start, end, dur, count in zip(
+        seg_idx[keep].tolist(), sub_idx[keep].tolist(), sub_is_long[keep].tolist(),
+        sub_start[keep].tolist(), sub_end[keep].tolist(), sub_duration[keep].tolist(),
+        counts[seg_idx[keep]].tolist()
+    ):
+        raw_segment = raw_segments[i]
+        if not long:
             final_segments.append({
                 **raw_segment,
                 'is_long_segment': False,
@@ -541,28 +599,18 @@ def cut_long_segments(raw_segments, sample_rate, total_samples, total_duration,
                 'sub_segment_index': 1
             })
         else:
-            # 长段切割
-            num_sub_segments = int(np.ceil(duration / max_segment_duration))
-            samples_per_sub_segment = int(max_segment_duration * sample_rate)
-            
-            for sub_idx in range(num_sub_segments):
-                sub_start_sample = start_sample + sub_idx * samples_per_sub_segment
-                sub_end_sample = min(start_sample + (sub_idx + 1) * samples_per_sub_segment, end_sample, total_samples)
-                sub_duration = (sub_end_sample - sub_start_sample) / sample_rate
-                
-                if sub_duration > 0.1:  # 跳过过短段
-                    final_segments.append({
-                        **raw_segment,
-                        'start_sample': sub_start_sample,
-                        'end_sample': sub_end_sample,
-                        'start_time': sub_start_sample / sample_rate,
-                        'end_time': sub_end_sample / sample_rate,
-                        'duration': sub_duration,
-                        'is_long_segment': True,
-                        'sub_segment_count': num_sub_segments,
-                        'sub_segment_index': sub_idx + 1,
-                        'original_duration': duration
-                    })
+            final_segments.append({
+                **raw_segment,
+                'start_sample': start,
+                'end_sample': end,
+                'start_time': start / sample_rate,
+                'end_time': end / sample_rate,
+                'duration': dur,
+                'is_long_segment': True,
+                'sub_segment_count': count,
+                'sub_segment_index': sub + 1,
+                'original_duration': raw_segment['duration']
+            })
     
     return final_segments
 
@@ -582,71 +630,101 @@ def get_segments_summary(segments, sample_rate):
         for seg in segments
     ]
 
-async def transcribe_single_segment(
-    segment, 
+# 同时执行的转录批次数；GPU 上批次本身已并行，多批并发只会争用显存
+MAX_CONCURRENT_TRANSCRIPTION_BATCHES = 1
+
+def bucket_segments(segments, batch_size: int):
+    """按时长分桶组批：时长相近（同一 2 的幂秒数区间）的段放入同一批，减少批内填充"""
+    batch_size = max(1, batch_size)
+    batches = []
+    current, current_bucket = [], None
+    for segment in sorted(segments, key=lambda s: s['end_sample'] - s['start_sample']):
+        bucket = math.ceil(math.log2(max(segment['duration'], 1.0)))
+        if current and (bucket != current_bucket or len(current) >= batch_size):
+            batches.append(current)
+            current = []
+        current.append(segment)
+        current_bucket = bucket
+    if current:
+        batches.append(current)
+    # 包含靠前段的批次优先执行，使流式输出尽早开始
+    batches.sort(key=lambda batch: min(s['segment_index'] for s in batch))
+    return batches
+
+def _segment_error(segment, error: str):
+    # 错误路径上不能再因缺少字段而抛出，仅 segment_index 为必需字段
+    return {
+        "type": "segment_error",
+        "segment_index": segment['segment_index'],
+        "original_index": segment.get('original_index'),
+        "error": error,
+        "is_long_segment": segment.get('is_long_segment', False),
+        "timestamp": time.time()
+    }
+
+async def transcribe_segment_batch(
+    segments, 
     full_audio_tensor, 
     sample_rate,
     hotwords: Optional[List[str]] = None,
     max_new_tokens: int = 128
 ):
-    """转录单个段（异步），支持热词"""
-    segment_index = segment['segment_index']
-    start_sample = segment['start_sample']
-    end_sample = segment['end_sample']
-    start_time = segment['start_time']
-    end_time = segment['end_time']
-    duration = segment['duration']
-    is_long_segment = segment['is_long_segment']
+    """批量转录一组段（异步），支持热词；返回与输入顺序一致的结果列表"""
+    results = [None] * len(segments)
+    valid_positions = []
+    segment_tensors = []
     
-    try:
-        # 从完整音频中提取段
-        segment_samples = full_audio_tensor[start_sample:end_sample]
+    for position, segment in enumerate(segments):
+        # 从完整音频中提取段（零拷贝视图）
+        segment_samples = full_audio_tensor.narrow(0, segment['start_sample'], segment['end_sample'] - segment['start_sample'])
         
         # 确保有足够的样本
         if len(segment_samples) < int(0.1 * sample_rate):  # 100ms
-            raise ValueError(f"段 {segment_index} 样本过少: {len(segment_samples)}")
+            error = f"段 {segment['segment_index']} 样本过少: {len(segment_samples)}"
+            logger.error(f"❌ 段 {segment['segment_index']} 转录失败: {error}")
+            results[position] = _segment_error(segment, error)
+            continue
         
-        # 直接使用张量（避免临时文件）
-        segment_tensor = segment_samples.clone()
-        if segment_tensor.ndim == 1:
-            segment_tensor = segment_tensor.unsqueeze(0)  # 转为 [1, samples]
-        
-        # 转录（CPU 密集型操作在后台线程）
-        loop = asyncio.get_event_loop()
-        transcript = await loop.run_in_executor(
-            None,
-            lambda: asr_model.transcribe(
-                segment_tensor, 
-                sampling_rate=sample_rate,
-                max_new_tokens=max_new_tokens,
-                hotwords=hotwords  # 传递热词
+        valid_positions.append(position)
+        segment_tensors.append(segment_samples.unsqueeze(0))  # 转为 [1, samples]
+    
+    if segment_tensors:
+        try:
+            # 转录（CPU/GPU 密集型操作在后台线程），整批一次 generate()
+            loop = asyncio.get_running_loop()
+            transcripts = await loop.run_in_executor(
+                asr_executor,
+                lambda: asr_model.transcribe_batch(
+                    segment_tensors, 
+                    sampling_rate=sample_rate,
+                    max_new_tokens=max_new_tokens,
+                    hotwords=hotwords  # 传递热词
+                )
             )
-        )
-
-        return {
-            "type": "segment_result",
-            "segment_index": segment_index,
-            "original_index": segment['original_index'],
-            "start_time": round(start_time, 3),
-            "end_time": round(end_time, 3),
-            "duration": round(duration, 3),
-            "text": transcript.strip(),
-            "processing_time": 0,  # 真实时间在外部计算
-            "is_long_segment": is_long_segment,
-            "hotwords_used": hotwords or [],
-            "timestamp": time.time()
-        }
+        except Exception as e:
+            indices = [segments[p]['segment_index'] for p in valid_positions]
+            logger.error(f"❌ 段 {indices} 批量转录失败: {str(e)}")
+            for position in valid_positions:
+                results[position] = _segment_error(segments[position], str(e))
+            return results
         
-    except Exception as e:
-        logger.error(f"❌ 段 {segment_index} 转录失败: {str(e)}")
-        return {
-            "type": "segment_error",
-            "segment_index": segment_index,
-            "original_index": segment['original_index'],
-            "error": str(e),
-            "is_long_segment": is_long_segment,
-            "timestamp": time.time()
-        }
+        for position, transcript in zip(valid_positions, transcripts):
+            segment = segments[position]
+            results[position] = {
+                "type": "segment_result",
+                "segment_index": segment['segment_index'],
+                "original_index": segment['original_index'],
+                "start_time": round(segment['start_time'], 3),
+                "end_time": round(segment['end_time'], 3),
+                "duration": round(segment['duration'], 3),
+                "text": transcript,  # ASRModel 已去除首尾空白
+                "processing_time": 0,  # 真实时间在外部计算
+                "is_long_segment": segment['is_long_segment'],
+                "hotwords_used": hotwords or [],
+                "timestamp": time.time()
+            }
+    
+    return results
 
 @app.post("/vad/config")
 async def update_vad_config(new_config: VADConfig):
@@ -673,30 +751,34 @@ async def update_vad_config(new_config: VADConfig):
 active_connections: Dict[str, ConnectionManager] = {}
 
 def cleanup_client_resources(client_id: str):
-    """清理客户端相关资源"""
-    if client_id in active_connections:
-        manager = active_connections[client_id]
-        try:
-            manager.cleanup()
-            logger.info(f"✅ 客户端资源已清理: {client_id}")
-        except Exception as e:
-            logger.error(f"❌ 清理客户端资源失败 (客户端: {client_id}): {str(e)}")
-        finally:
-            del active_connections[client_id]
+    """清理客户端相关资源（先移出连接表再清理，重复调用是安全的）"""
+    manager = active_connections.pop(client_id, None)
+    if manager is None:
+        return
+    try:
+        manager.cleanup()
+        logger.info(f"✅ 客户端资源已清理: {client_id}")
+    except Exception as e:
+        logger.error(f"❌ 清理客户端资源失败 (客户端: {client_id}): {str(e)}")
 
 def log_audio_metrics(audio_data: bytes, chunk_id: int, client_id: str):
     """记录音频数据指标用于调试"""
     if len(audio_data) == 0:
         logger.warning(f"🎤 客户端 {client_id} 音频数据为空 (chunk_id: {chunk_id})")
         return
+    
+    # 指标只用于调试日志，未启用 DEBUG 时不做计算
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
         
-    # 计算音量RMS
+    # 计算音量RMS（点积一次完成平方和）与峰值（直接在 int16 上归约，无临时数组）
     audio_array = np.frombuffer(audio_data, dtype=np.int16)
     if len(audio_array) > 0:
-        rms = np.sqrt(np.mean(np.square(audio_array.astype(np.float32))))
-        peak = np.max(np.abs(audio_array))
-        logger.debug(f"🎤 客户端 {client_id} 音频指标 - Chunk {chunk_id}: "
-                    f"大小={len(audio_data)}字节, RMS={rms:.2f}, 峰值={peak}")
+        samples = audio_array.astype(np.float32)
+        rms = math.sqrt(float(np.dot(samples, samples)) / len(samples))
+        peak = max(-int(audio_array.min()), int(audio_array.max()))
+        logger.debug("🎤 客户端 %s 音频指标 - Chunk %s: 大小=%d字节, RMS=%.2f, 峰值=%d",
+                     client_id, chunk_id, len(audio_data), rms, peak)
 
 @app.websocket("/ws/audio")
 async def websocket_audio(websocket: WebSocket):
@@ -777,33 +859,20 @@ async def websocket_audio(websocket: WebSocket):
                     logger.warning(f"🔌 客户端已断开连接，停止处理: {client_id}")
                     break
                 
-                # 接收数据（带超时）
-                try:
-                    message = await asyncio.wait_for(websocket.receive(), timeout=5.0)
-                    manager.last_activity = time.time()
-                    
-                    # 处理断开连接
-                    if message.get('type') == 'websocket.disconnect':
-                        logger.info(f"🔌 客户端主动断开连接，代码: {message.get('code', 'unknown')}")
-                        break
-                    
-                except asyncio.TimeoutError:
-                    # 检查长时间无活动
-                    if time.time() - manager.last_activity > 30.0:
-                        logger.warning(f"⏰ 连接超时无活动，客户端: {client_id}")
-                        await manager.send_json({
-                            "type": "error",
-                            "code": 408,
-                            "message": "连接超时，30秒内无活动",
-                            "client_id": client_id
-                        })
-                        break
-                    continue
+                # 接收数据：空闲连接的存活检测交给 uvicorn 的 WebSocket ping/pong，
+                # 对端失联时 ping 超时关闭传输层，这里会收到断开消息
+                message = await websocket.receive()
+                manager.last_activity = time.time()
+                
+                # 处理断开连接
+                if message.get('type') == 'websocket.disconnect':
+                    logger.info(f"🔌 客户端主动断开连接，代码: {message.get('code', 'unknown')}")
+                    break
                 
                 # 处理二进制音频数据 
                 if 'bytes' in message and message['bytes'] is not None:
                     audio_data = message['bytes']
-                    logger.debug(f"🎧 收到音频数据: {len(audio_data)} 字节，客户端: {client_id}")
+                    logger.debug("🎧 收到音频数据: %d 字节，客户端: %s", len(audio_data), client_id)
                     
                     if len(audio_data) == 0:
                         logger.warning(f"⚠️ 空音频数据，客户端: {client_id}")
@@ -812,30 +881,28 @@ async def websocket_audio(websocket: WebSocket):
                     # 验证音频数据大小
                     expected_size = AppConfig.AUDIO_CHUNK_SIZE
                     if len(audio_data) != expected_size:
-                        logger.warning(f"⚠️ 音频数据大小不匹配，预期: {expected_size}, 实际: {len(audio_data)}，客户端: {client_id}")
+                        logger.warning("⚠️ 音频数据大小不匹配，预期: %d, 实际: %d，客户端: %s", expected_size, len(audio_data), client_id)
                         
                         # 处理大数据块
                         if len(audio_data) > expected_size:
-                            logger.info(f"🔧 处理大数据块: {len(audio_data)} 字节，可能包含 {len(audio_data) // expected_size + 1} 个片段")
+                            logger.info("🔧 处理大数据块: %d 字节，可能包含 %d 个片段", len(audio_data), len(audio_data) // expected_size + 1)
                             
-                            # 处理完整的片段
+                            # 处理完整的片段（memoryview 切片零拷贝，缓冲区写入时才复制）
+                            audio_view = memoryview(audio_data)
                             for i in range(0, len(audio_data) - expected_size + 1, expected_size):
-                                chunk = audio_data[i:i+expected_size]
-                                if len(chunk) == expected_size:
-                                    await manager.process_audio_chunk(chunk, debug_audio)
-                                    log_audio_metrics(chunk, manager.last_chunk_id, client_id)
+                                chunk = audio_view[i:i + expected_size]
+                                await manager.process_audio_chunk(chunk, debug_audio)
+                                log_audio_metrics(chunk, manager.last_chunk_id, client_id)
                             
                             # 剩余数据
                             remaining = len(audio_data) % expected_size
                             if remaining > 0:
-                                logger.info(f"🔧 剩余 {remaining} 字节，等待下一批数据完成片段")
+                                logger.info("🔧 剩余 %d 字节，等待下一批数据完成片段", remaining)
                             continue
                         # 处理小数据块 - 填充
                         elif len(audio_data) < expected_size:
-                            logger.info(f"🔧 填充小音频数据: {len(audio_data)} -> {expected_size} 字节")
-                            padded_data = bytearray(audio_data)
-                            padded_data.extend(b'\x00' * (expected_size - len(audio_data)))
-                            audio_data = bytes(padded_data)
+                            logger.info("🔧 填充小音频数据: %d -> %d 字节", len(audio_data), expected_size)
+                            audio_data = audio_data + bytes(expected_size - len(audio_data))
                     
                     # 处理单个音频片段
                     await manager.process_audio_chunk(audio_data, debug_audio)
@@ -845,9 +912,9 @@ async def websocket_audio(websocket: WebSocket):
                 elif 'text' in message and message['text'] is not None:
                     try:
                         text_data = message['text']
-                        msg_data = json.loads(text_data)
+                        msg_data = json_loads(text_data)
                         msg_type = msg_data.get('type', 'unknown')
-                        logger.debug(f"⚙️ 收到控制消息: {msg_type}, 客户端: {client_id}")
+                        logger.debug("⚙️ 收到控制消息: %s, 客户端: %s", msg_type, client_id)
                         
                         if msg_type == 'close':
                             logger.info(f"👋 客户端请求关闭连接, 客户端: {client_id}")
@@ -859,13 +926,13 @@ async def websocket_audio(websocket: WebSocket):
                                 "timestamp": time.time(),
                                 "client_id": client_id
                             })
-                            logger.debug(f"🏓 已回应 ping，客户端: {client_id}")
+                            logger.debug("🏓 已回应 ping，客户端: %s", client_id)
                             
                         elif msg_type == 'get_state':
                             state = {
                                 "type": "connection_state",
                                 "client_id": client_id,
-                                "buffer_size": len(manager.buffer_manager.chunk_buffer),
+                                "buffer_size": len(manager.buffer_manager),
                                 "active_segment": manager.buffer_manager.current_segment is not None,
                                 "vad_state": manager.vad_processor.is_speaking_state(),
                                 "last_chunk_id": manager.last_chunk_id,
@@ -877,7 +944,7 @@ async def websocket_audio(websocket: WebSocket):
                                 }
                             }
                             await manager.send_json(state)
-                            logger.debug(f"📊 已发送连接状态，客户端: {client_id}")
+                            logger.debug("📊 已发送连接状态，客户端: %s", client_id)
                             
                         elif msg_type == 'vad_config':
                             config = msg_data.get('config', {})
@@ -933,7 +1000,7 @@ async def websocket_audio(websocket: WebSocket):
                             "client_id": client_id
                         })
                     except Exception as e:
-                        logger.error(f"❌ 处理控制消息失败: {str(e)}\n{traceback.format_exc()}, 客户端: {client_id}")
+                        logger.error(f"❌ 处理控制消息失败: {str(e)}, 客户端: {client_id}", exc_info=True)
                         await manager.send_json({
                             "type": "error",
                             "code": 500,
@@ -941,13 +1008,13 @@ async def websocket_audio(websocket: WebSocket):
                             "client_id": client_id
                         })
                 else:
-                    logger.debug(f"🔍 未知消息格式，客户端: {client_id}, 消息: {message}")
+                    logger.debug("🔍 未知消息格式，客户端: %s, 消息: %s", client_id, message)
             
             except WebSocketDisconnect as e:
                 logger.info(f"🔌 客户端正常断开连接 (code={e.code}), 客户端: {client_id}")
                 break
             except Exception as e:
-                logger.error(f"❌ WebSocket 处理错误 (客户端: {client_id}): {str(e)}\n{traceback.format_exc()}")
+                logger.error(f"❌ WebSocket 处理错误 (客户端: {client_id}): {str(e)}", exc_info=True)
                 await manager.send_json({
                     "type": "error",
                     "code": 500,
@@ -956,17 +1023,16 @@ async def websocket_audio(websocket: WebSocket):
                 })
     
     except Exception as e:
-        logger.critical(f"❌ WebSocket 未处理异常 (客户端: {client_id}): {str(e)}\n{traceback.format_exc()}")
+        logger.critical(f"❌ WebSocket 未处理异常 (客户端: {client_id}): {str(e)}", exc_info=True)
     finally:
         logger.info(f"🧹 最终清理客户端资源: {client_id}")
         
         # 清理连接
-        if client_id in active_connections:
-            cleanup_client_resources(client_id)
+        cleanup_client_resources(client_id)
         
         # 清理调试音频
         if debug_audio:
-            debug_audio.cleanup()
+            await debug_audio.cleanup()
         
         # 确保连接关闭
         try:
@@ -998,8 +1064,12 @@ if __name__ == "__main__":
         "port": AppConfig.PORT,
         "reload": False,
         "log_level": AppConfig.LOG_LEVEL.lower(),
-        "workers": 1  # WebSocket 不支持多 worker
+        "workers": 1,  # WebSocket 不支持多 worker
+        "ws_ping_interval": 20.0,  # 协议层心跳间隔（秒）
+        "ws_ping_timeout": 20.0,  # 心跳无响应即断开失联客户端
+        "loop": "uvloop" if HAS_UVLOOP else "asyncio"
     }
+    logger.info(f"🔁 事件循环: {uvicorn_config['loop']}")
     
     if AppConfig.USE_HTTPS:
         logger.info("🔒 启用 HTTPS 模式")
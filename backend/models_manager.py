@@ -1,6 +1,7 @@
 # models.py (集中管理所有模型实例)
 from typing import Optional
 import logging
+import torch
 
 from config import AppConfig
 from asr import ASRModel
@@ -29,7 +30,15 @@ def asr_model_init() -> None:
         logger.warning("ASR model already initialized. Skipping re-initialization.")
         return
     
-    _asr_model = ASRModel(AppConfig.CHECKPOINT_PATH, device=AppConfig.DEVICE,mode="native")  # native or int8
+    _asr_model = ASRModel(
+        AppConfig.CHECKPOINT_PATH,
+        device=AppConfig.DEVICE,
+        mode=AppConfig.ASR_MODE,  # native / int8 / int4
+        compile_model=AppConfig.ASR_COMPILE,
+        assistant_checkpoint_dir=AppConfig.ASR_ASSISTANT_CHECKPOINT_PATH or None,
+        prompt_lookup_num_tokens=AppConfig.ASR_PROMPT_LOOKUP_TOKENS,
+        static_cache_len=AppConfig.ASR_STATIC_CACHE_LEN
+    )
 
 def vad_model_init() -> None:
     """
@@ -46,7 +55,16 @@ def vad_model_init() -> None:
         logger.warning("VAD processor already initialized. Skipping re-initialization.")
         return
     
-    _vad_processor = VADProcessor()
+    _vad_processor = VADProcessor(device=vad_device())
+    
+
+def vad_device() -> str:
+    """
+    VAD 模型运行设备：启用 VAD_USE_GPU 且 ASR 运行在可用的 CUDA 设备上时与其共用，否则使用 CPU
+    """
+    if AppConfig.VAD_USE_GPU and AppConfig.DEVICE.startswith("cuda") and torch.cuda.is_available():
+        return AppConfig.DEVICE
+    return "cpu"
     
 
 def asr_model_get() -> ASRModel:
@@ -1,65 +1,165 @@
-import os
-import time
-import logging
 import asyncio
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import torch
-import asyncio
-import traceback
 from config import AppConfig
 from models_manager import asr_model_get
 
 logger = logging.getLogger("speech-to-text")
 
+_CHUNK_SAMPLES = AppConfig.AUDIO_CHUNK_SIZE // 2  # 每个音频片段的样本数
+
+# ======================
+# 跨客户端微批处理
+# ======================
+class ASRMicroBatcher:
+    """
+    所有客户端共享同一个 ASR 模型：短时间窗口内到达的转录请求合并为一次 generate()，
+    推理在工作线程执行，不阻塞事件循环；批次依次执行，同一时刻只有一个批次占用模型
+    """
+    def __init__(self, window_ms: int, max_batch_size: int):
+        self.window_s = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def submit(self, audio_tensor: torch.Tensor, max_new_tokens: int) -> str:
+        """提交一段音频，等待所在批次完成后返回转录文本"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((audio_tensor, max_new_tokens, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            # 收集窗口期内的后续请求，凑满批次即提前执行
+            deadline = loop.time() + self.window_s
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # max_new_tokens 相同的请求才合并，保证临时转录的生成长度不被放大
+            groups: Dict[int, List[Tuple[torch.Tensor, asyncio.Future]]] = {}
+            for audio_tensor, max_new_tokens, future in pending:
+                if not future.cancelled():
+                    groups.setdefault(max_new_tokens, []).append((audio_tensor, future))
+            for max_new_tokens, items in groups.items():
+                await self._run_batch(items, max_new_tokens)
+    
+    @staticmethod
+    async def _run_batch(items: List[Tuple[torch.Tensor, asyncio.Future]], max_new_tokens: int):
+        try:
+            # 每批只取一次模型；未初始化时的异常同样转交给等待的请求，不会终止批处理任务
+            asr_model = asr_model_get()
+            if len(items) == 1:
+                transcripts = [await asyncio.to_thread(
+                    asr_model.transcribe,
+                    items[0][0],
+                    sampling_rate=16000,
+                    max_new_tokens=max_new_tokens
+                )]
+            else:
+                transcripts = await asyncio.to_thread(
+                    asr_model.transcribe_batch,
+                    [audio_tensor for audio_tensor, _ in items],
+                    sampling_rate=16000,
+                    max_new_tokens=max_new_tokens
+                )
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        if len(items) > 1:
+            logger.debug("🧩 微批转录完成: %d 段, max_new_tokens=%d", len(items), max_new_tokens)
+        for (_, future), transcript in zip(items, transcripts):
+            if not future.done():
+                future.set_result(transcript)  # ASRModel 已去除首尾空白
+
+asr_batcher = ASRMicroBatcher(AppConfig.ASR_MICRO_BATCH_WINDOW_MS, AppConfig.ASR_MICRO_BATCH_SIZE)
+
 # ======================
 # 转录管理器
 # ======================
 class TranscriptionManager:
     """转录管理器，处理临时和确认转录"""
-    async def transcribe_temporary(self, audio_data: bytes) -> str:
+    async def transcribe_temporary(self, audio_samples: np.ndarray) -> str:
         """临时转录，快速响应"""
-        if not audio_data or len(audio_data) < AppConfig.AUDIO_CHUNK_SIZE:
+        if len(audio_samples) < _CHUNK_SAMPLES:
             return ""
         
         try:
-            return await self._transcribe(audio_data, is_final=False, max_new_tokens=15)
+            return await self._transcribe(audio_samples, is_final=False, max_new_tokens=15)
         except Exception as e:
-            logger.error(f"❌ 临时转录失败: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"❌ 临时转录失败: {str(e)}", exc_info=True)
             return ""
     
-    async def transcribe_committed(self, audio_data: bytes, segment_duration: float) -> str:
+    async def transcribe_committed(self, audio_samples: np.ndarray, segment_duration: float) -> str:
         """确认转录，高准确度"""
-        if not audio_data or len(audio_data) < AppConfig.AUDIO_CHUNK_SIZE * 2:
+        if len(audio_samples) < _CHUNK_SAMPLES * 2:
             return ""
         
         try:
             # 根据时长调整 max_new_tokens
             max_new_tokens = min(50 + int(segment_duration * 5), 200)
-            return await self._transcribe(audio_data, is_final=True, max_new_tokens=max_new_tokens)
+            return await self._transcribe(audio_samples, is_final=True, max_new_tokens=max_new_tokens)
         except Exception as e:
-            logger.error(f"❌ 确认转录失败: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"❌ 确认转录失败: {str(e)}", exc_info=True)
             return ""
     
-    async def _transcribe(self, audio_data: bytes, is_final: bool, max_new_tokens: int) -> str:
-        """通用转录方法"""
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        if len(audio_array) == 0:
-            return ""
-        
-        audio_array = audio_array.copy()
-        audio_tensor = torch.from_numpy(audio_array)
-        audio_tensor = audio_tensor.float() / 32768.0
-        
-        if len(audio_tensor.shape) == 1:
-            audio_tensor = audio_tensor.unsqueeze(0)
+    async def transcribe_committed_batch(self, audio_list: List[np.ndarray], durations: List[float]) -> List[str]:
+        """批量确认转录：多个子段合并为一次 generate() 调用，结果与输入顺序一致"""
+        results = [""] * len(audio_list)
+        valid = [
+            i for i, audio_samples in enumerate(audio_list)
+            if len(audio_samples) >= _CHUNK_SAMPLES * 2
+        ]
+        if not valid:
+            return results
         
-        asr_model = asr_model_get()
-        if asr_model:
-            result = asr_model.transcribe(
-                audio_tensor,
-                sampling_rate=16000,
-                max_new_tokens=max_new_tokens
+        batch_size = max(1, AppConfig.COMMITTED_BATCH_SIZE)
+        for start in range(0, len(valid), batch_size):
+            indices = valid[start:start + batch_size]
+            max_new_tokens = min(50 + int(max(durations[i] for i in indices) * 5), 200)
+            # 同批子段使用相同的 max_new_tokens，由微批处理器合并为一次 generate()
+            transcripts = await asyncio.gather(
+                *(asr_batcher.submit(self._to_tensor(audio_list[i]), max_new_tokens) for i in indices),
+                return_exceptions=True
             )
-            return result.strip()
+            for i, transcript in zip(indices, transcripts):
+                if isinstance(transcript, Exception):
+                    logger.error(f"❌ 批量确认转录失败: {str(transcript)}", exc_info=transcript)
+                    continue
+                results[i] = transcript
+        return results
+    
+    @staticmethod
+    def _to_tensor(audio_samples: np.ndarray) -> torch.Tensor:
+        """缓冲区中已归一化的 float32 样本零拷贝包装为 [1, T] 张量"""
+        return torch.from_numpy(audio_samples).unsqueeze(0)
+    
+    async def _transcribe(self, audio_samples: np.ndarray, is_final: bool, max_new_tokens: int) -> str:
+        """通用转录方法（audio_samples 须为调用方独占的数组，推理在工作线程中读取）"""
+        if len(audio_samples) == 0:
+            return ""
+        
+        # 静音门限：一次点积得到 RMS，整段静音时直接跳过模型推理
+        rms = math.sqrt(float(np.dot(audio_samples, audio_samples)) / len(audio_samples))
+        if rms < AppConfig.SILENCE_RMS_THRESHOLD:
+            logger.debug("🔇 音频能量过低 (RMS=%.5f)，跳过转录", rms)
+            return ""
         
-        return ""
+        return await asr_batcher.submit(self._to_tensor(audio_samples), max_new_tokens)
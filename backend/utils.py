@@ -1,7 +1,46 @@
 import io
+import os
+import json
+import logging
+import wave
+import warnings
+from typing import BinaryIO, Optional, Union
 from pydub import AudioSegment
 import numpy as np
 import torch
+import torchaudio
+
+logger = logging.getLogger("speech-to-text")
+
+try:
+    import soundfile as sf
+    HAS_SOUNDFILE = True
+except ImportError:
+    HAS_SOUNDFILE = False
+    warnings.warn("soundfile not installed. Uploaded audio will be decoded via pydub/ffmpeg. Install with: pip install soundfile")
+
+try:
+    import soxr
+    HAS_SOXR = True
+except ImportError:
+    HAS_SOXR = False
+    warnings.warn("soxr not installed. Uploaded audio will be resampled with torchaudio. Install with: pip install soxr")
+
+try:
+    import orjson
+
+    def json_dumps(data) -> bytes:
+        """序列化为 UTF-8 JSON 字节（orjson，支持 numpy 标量/数组）"""
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    
+    # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方按标准库异常捕获即可
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(data) -> bytes:
+        """序列化为 UTF-8 JSON 字节（未安装 orjson 时回退到标准库 json）"""
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+    
+    json_loads = json.loads
 
 
 def convert_audio_to_wav(file_content, filename):
@@ -18,27 +57,98 @@ def convert_audio_to_wav(file_content, filename):
     audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
     return audio
 
+def decode_audio_to_tensor(source: Union[bytes, BinaryIO], target_sr: int = 16000) -> Optional[torch.Tensor]:
+    """
+    在进程内直接解码为 float32 张量 [1, N]（单声道、target_sr 采样率）
+    
+    source 可以是字节，也可以是可随机访问的二进制文件对象（如 UploadFile.file），
+    文件对象由解码器按需读取，无需先把整个上传读入内存。
+    依次尝试 soundfile（WAV/FLAC/OGG 等 libsndfile 格式；未安装时用标准库解码 16-bit PCM WAV）
+    与 torchaudio（进程内 FFmpeg，覆盖 MP3/M4A 等），重采样优先使用 soxr。
+    均无法解码时返回 None，由调用方回退到 pydub/ffmpeg 子进程路径。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    decoded = _decode_with_soundfile(source) if HAS_SOUNDFILE else _decode_pcm16_wav(source)
+    if decoded is None:
+        decoded = _decode_with_torchaudio(source)
+    if decoded is None:
+        return None
+    samples, sample_rate = decoded
+    
+    # [N, C] -> 单声道（与 pydub set_channels(1) 一致，取各声道均值）
+    samples = samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1, dtype=np.float32)
+    samples = np.ascontiguousarray(samples, dtype=np.float32)
+    if sample_rate != target_sr:
+        if HAS_SOXR:
+            samples = soxr.resample(samples, sample_rate, target_sr)
+        else:
+            return torchaudio.functional.resample(torch.from_numpy(samples).unsqueeze(0), sample_rate, target_sr)
+    return torch.from_numpy(samples).unsqueeze(0)
+
+def _decode_with_soundfile(source: BinaryIO):
+    """soundfile 解码，返回 ([N, C] float32 样本, 采样率)；不支持的格式返回 None"""
+    source.seek(0)
+    try:
+        return sf.read(source, dtype='float32', always_2d=True)
+    except Exception:
+        return None
+
+def _decode_pcm16_wav(source: BinaryIO):
+    """未安装 soundfile 时的 WAV 解码路径，非 RIFF/WAVE 数据返回 None"""
+    source.seek(0)
+    header = source.read(12)
+    source.seek(0)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    return _read_pcm16_wav(source)
+
+def _decode_with_torchaudio(source: BinaryIO):
+    """torchaudio 进程内解码（FFmpeg 后端），返回 ([N, C] float32 样本, 采样率)；失败返回 None"""
+    source.seek(0)
+    try:
+        waveform, sample_rate = torchaudio.load(source)
+    except Exception:
+        return None
+    return waveform.numpy().T, sample_rate
+
+def _read_pcm16_wav(wav_source: BinaryIO):
+    """用标准库 wave 读取 16-bit PCM WAV，返回 ([N, C] float32 样本, 采样率)；其他编码返回 None"""
+    try:
+        with wave.open(wav_source, 'rb') as wav_file:
+            if wav_file.getsampwidth() != 2:
+                return None
+            channels = wav_file.getnchannels()
+            sample_rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    samples = np.frombuffer(frames, dtype='<i2').astype(np.float32)
+    samples *= 1.0 / 32768.0
+    return samples.reshape(-1, channels), sample_rate
+
 def audiosegment_to_tensor(audio_segment):
     """将AudioSegment转换为PyTorch张量"""
-    samples = np.array(audio_segment.get_array_of_samples())
-    samples = samples.astype(np.float32) / 32768.0  # 归一化到[-1, 1]
-    return torch.tensor(samples).unsqueeze(0)
+    # 一次转换得到连续 float32 缓冲区，原地归一化后零拷贝交给 torch
+    samples = np.asarray(audio_segment.get_array_of_samples(), dtype=np.float32)
+    samples *= 1.0 / 32768.0  # 归一化到[-1, 1]
+    return torch.from_numpy(samples).unsqueeze(0)
+
+# 文件扩展名 -> pydub/ffmpeg 格式提示
+_AUDIO_FORMAT_BY_EXT = {
+    '.wav': 'wav',
+    '.mp3': 'mp3',
+    '.mpeg': 'mp3',
+    '.m4a': 'mp4',
+    '.mp4': 'mp4',
+    '.flac': 'flac',
+    '.ogg': 'ogg',
+    '.webm': 'ogg',
+}
 
 def get_audio_format(filename):
-    """智能检测音频格式"""
-    filename = filename.lower()
-    if '.wav' in filename:
-        return 'wav'
-    elif '.mp3' in filename or '.mpeg' in filename:
-        return 'mp3'
-    elif '.m4a' in filename or '.mp4' in filename:
-        return 'mp4'
-    elif '.flac' in filename:
-        return 'flac'
-    elif '.ogg' in filename or '.webm' in filename:
-        return 'ogg'
-    else:
-        return None
+    """按文件扩展名检测音频格式，未知扩展名返回 None"""
+    return _AUDIO_FORMAT_BY_EXT.get(os.path.splitext(filename)[1].lower())
         
 def standardize_audio_tensor(audio_tensor: torch.Tensor) -> torch.Tensor:
     """
@@ -62,7 +172,7 @@ def standardize_audio_tensor(audio_tensor: torch.Tensor) -> torch.Tensor:
     if audio_tensor.dim() == 1:
         # [N] -> [1, N]
         audio_tensor = audio_tensor.unsqueeze(0)
-        print(f"升维: {original_shape} -> {audio_tensor.shape}")
+        logger.debug("升维: %s -> %s", original_shape, audio_tensor.shape)
     
     elif audio_tensor.dim() == 2:
         # 处理 [C, N] 格式 (正确格式)
@@ -72,7 +182,7 @@ def standardize_audio_tensor(audio_tensor: torch.Tensor) -> torch.Tensor:
         # 处理 [N, C] 格式 (转置)
         elif audio_tensor.shape[1] == 1:
             audio_tensor = audio_tensor.transpose(0, 1)  # [N, 1] -> [1, N]
-            print(f"转置: {original_shape} -> {audio_tensor.shape}")
+            logger.debug("转置: %s -> %s", original_shape, audio_tensor.shape)
         
         # 多声道处理 (取第一通道)
         elif audio_tensor.shape[0] > 1:
@@ -90,5 +200,8 @@ def standardize_audio_tensor(audio_tensor: torch.Tensor) -> torch.Tensor:
     if audio_tensor.shape[0] != 1:
         raise ValueError(f"通道数必须为1，当前形状: {audio_tensor.shape}")
     
-    print(f"✅ 标准化后形状: {audio_tensor.shape}, 值范围: [{audio_tensor.min().item():.4f}, {audio_tensor.max().item():.4f}]")
+    # 值范围只用于调试日志：未启用 DEBUG 时跳过整段音频的归约
+    if logger.isEnabledFor(logging.DEBUG):
+        value_min, value_max = torch.aminmax(audio_tensor)
+        logger.debug("✅ 标准化后形状: %s, 值范围: [%.4f, %.4f]", audio_tensor.shape, value_min.item(), value_max.item())
     return audio_tensor
\ No newline at end of file
@@ -1,26 +1,108 @@
 import torch
 import numpy as np
 import torchaudio
-from silero_vad import load_silero_vad, get_speech_timestamps, VADIterator, read_audio
+from silero_vad import load_silero_vad, VADIterator, read_audio
+from typing import Dict, Tuple
+
+
+def _probs_to_timestamps(
+    probs: np.ndarray,
+    threshold: float,
+    window_size: int,
+    audio_length: int,
+    min_speech_samples: float,
+    min_silence_samples: float,
+    speech_pad_samples: float,
+    neg_threshold: float = None
+) -> list:
+    """
+    将逐帧语音概率转换为语音段时间戳（向量化实现）
+    
+    与 silero_vad.get_speech_timestamps（max_speech_duration_s=inf）的状态机结果一致：
+    概率 >= threshold 的帧开始/维持语音；两个语音帧之间，从第一个 < neg_threshold 的帧起
+    若存在持续 min_silence_samples 的静音，则在该帧处结束语音段。
+    """
+    if neg_threshold is None:
+        neg_threshold = max(threshold - 0.15, 0.01)
+    probs = np.asarray(probs, dtype=np.float64)  # 与 Python float 阈值按双精度比较
+    num_frames = len(probs)
+    hi_frames = np.flatnonzero(probs >= threshold)
+    if len(hi_frames) == 0:
+        return []
+    
+    # next_neg[f]: f 及之后第一个静音帧；prev_neg[f]: f 及之前最后一个静音帧
+    frame_ids = np.arange(num_frames)
+    is_neg = probs < neg_threshold
+    next_neg = np.minimum.accumulate(np.where(is_neg, frame_ids, num_frames)[::-1])[::-1]
+    next_neg = np.append(next_neg, num_frames)
+    prev_neg = np.maximum.accumulate(np.where(is_neg, frame_ids, -1))
+    
+    # 每个语音帧之后的间隔（最后一个语音帧之后延伸到音频结尾）
+    gap_start = hi_frames + 1
+    gap_end = np.append(hi_frames[1:], num_frames)  # 不含
+    has_gap = gap_start < gap_end
+    first_neg = next_neg[np.minimum(gap_start, num_frames)]
+    last_neg = prev_neg[np.maximum(gap_end - 1, 0)]
+    split = has_gap & (first_neg < gap_end) & ((last_neg - first_neg) * window_size >= min_silence_samples)
+    
+    starts = np.concatenate(([hi_frames[0]], gap_end[:-1][split[:-1]])) * window_size
+    ends = first_neg[split] * window_size
+    if not split[-1]:
+        ends = np.append(ends, audio_length)  # 最后一段持续到音频结尾
+    keep = (ends - starts) > min_speech_samples
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) == 0:
+        return []
+    
+    # 两侧补齐 speech_pad：相邻段间隔不足 2*pad 时平分间隔
+    silences = starts[1:] - ends[:-1]
+    narrow = silences < 2 * speech_pad_samples
+    new_starts = starts.astype(np.float64)
+    new_ends = ends.astype(np.float64)
+    new_ends[:-1] = np.where(narrow, ends[:-1] + silences // 2, np.minimum(audio_length, ends[:-1] + speech_pad_samples))
+    new_starts[1:] = np.maximum(0, np.where(narrow, starts[1:] - silences // 2, starts[1:] - speech_pad_samples))
+    new_starts[0] = max(0, starts[0] - speech_pad_samples)
+    new_ends[-1] = min(audio_length, ends[-1] + speech_pad_samples)
+    
+    return [
+        {'start': int(start), 'end': int(end)}
+        for start, end in zip(new_starts.tolist(), new_ends.tolist())
+    ]
+
 
 class VADProcessor:
-    def __init__(self, threshold=0.5, sampling_rate=16000):
+    def __init__(self, threshold=0.5, sampling_rate=16000, device="cpu"):
         """
         初始化 VAD 处理器
         :param threshold: VAD 阈值 (0.0-1.0)
         :param sampling_rate: 采样率 (Hz)，必须是8000或16000
+        :param device: 模型运行设备 (cpu/cuda)
         """
-        self.model = load_silero_vad()
+        self.device = torch.device(device)
+        self.model = load_silero_vad().to(self.device)
+        # GPU 上使用独立的 CUDA 流，避免 VAD 前向排在 ASR 默认流的 kernel 之后
+        self._stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
         self.sampling_rate = sampling_rate
         self.threshold = threshold
         self.min_speech_duration = 0.3  # 最小语音持续时间(秒)
         self.max_silence_duration = 1.0  # 最大静音持续时间(秒)
         self.vad_iterator = None
+        # 按 (原采样率, 目标采样率) 缓存重采样器，避免每次调用重新构建滤波核
+        self._resamplers: Dict[Tuple[int, int], torchaudio.transforms.Resample] = {}
         
         # 验证采样率
         if self.sampling_rate not in [8000, 16000]:
             raise ValueError("采样率必须是8000或16000 Hz")
     
+    def _resample(self, audio_tensor, orig_freq, new_freq):
+        """使用缓存的重采样器转换采样率"""
+        key = (orig_freq, new_freq)
+        resampler = self._resamplers.get(key)
+        if resampler is None:
+            resampler = torchaudio.transforms.Resample(orig_freq=orig_freq, new_freq=new_freq)
+            self._resamplers[key] = resampler
+        return resampler(audio_tensor)
+    
     def _normalize_audio(self, audio_tensor):
         """
         标准化音频到[-1, 1]范围
@@ -32,9 +114,12 @@ class VADProcessor:
         if audio_tensor.dtype not in [torch.float32, torch.float64]:
             audio_tensor = audio_tensor.float()
         
-        # 归一化到[-1, 1]范围
-        if audio_tensor.abs().max() > 1.0:
-            audio_tensor = audio_tensor / audio_tensor.abs().max()
+        # 归一化到[-1, 1]范围：aminmax 一次遍历得到峰值，避免两次 abs().max()
+        if audio_tensor.numel() > 0:
+            low, high = torch.aminmax(audio_tensor)
+            peak = torch.maximum(high, -low)
+            if peak > 1.0:
+                audio_tensor = audio_tensor / peak
         
         return audio_tensor
     
@@ -60,32 +145,58 @@ class VADProcessor:
         # 确保是16kHz采样率（创建副本，不修改self.sampling_rate）
         current_sampling_rate = self.sampling_rate
         if current_sampling_rate != 16000:
-            resampler = torchaudio.transforms.Resample(
-                orig_freq=current_sampling_rate, 
-                new_freq=16000
-            )
-            audio = resampler(audio)
+            audio = self._resample(audio, current_sampling_rate, 16000)
             current_sampling_rate = 16000
         
-        # 使用正确的 API 调用
-        speech_timestamps = get_speech_timestamps(
-            audio,
-            self.model,
+        # 一次性计算逐帧语音概率，再向量化生成时间戳（等价于 get_speech_timestamps）
+        probs = self._speech_probs(audio, current_sampling_rate)
+        speech_timestamps = _probs_to_timestamps(
+            probs,
             threshold=threshold,
-            sampling_rate=current_sampling_rate,
-            min_speech_duration_ms=int(self.min_speech_duration * 1000),
-            max_speech_duration_s=float('inf'),
-            min_silence_duration_ms=int(self.max_silence_duration * 1000)
+            window_size=512,
+            audio_length=len(audio),
+            min_speech_samples=current_sampling_rate * self.min_speech_duration,
+            min_silence_samples=current_sampling_rate * self.max_silence_duration,
+            speech_pad_samples=current_sampling_rate * 30 / 1000
         )
         
         is_speech = len(speech_timestamps) > 0
         return speech_timestamps, is_speech
     
-    def is_voice_active(self, audio_chunk, threshold=None):
+    @torch.no_grad()
+    def _speech_probs(self, audio: torch.Tensor, sampling_rate: int) -> np.ndarray:
+        """
+        计算 16kHz 音频每个 512 样本窗口的语音概率
+        """
+        if self._stream is None:
+            return self._forward_probs(audio, sampling_rate).numpy()
+        
+        with torch.cuda.stream(self._stream):
+            audio = audio.to(self.device, non_blocking=True)
+            return self._forward_probs(audio, sampling_rate).cpu().numpy()
+    
+    def _forward_probs(self, audio: torch.Tensor, sampling_rate: int) -> torch.Tensor:
+        """在模型所在设备上计算逐窗语音概率（每次调用都从初始循环状态开始）"""
+        audio_forward = getattr(self.model, 'audio_forward', None)
+        if audio_forward is not None:
+            # 模型内部完成分窗、补零与循环状态传递，避免 Python 层逐窗调用
+            return audio_forward(audio.unsqueeze(0), sampling_rate).squeeze(0)
+        
+        self.model.reset_states()
+        window_size = 512
+        if len(audio) % window_size:
+            audio = torch.nn.functional.pad(audio, (0, window_size - len(audio) % window_size))
+        return torch.cat([
+            self.model(audio[i:i + window_size], sampling_rate).reshape(-1)
+            for i in range(0, len(audio), window_size)
+        ]).float()
+    
+    def is_voice_active(self, audio_chunk, threshold=None, already_normalized=False):
         """
         检查音频块是否包含语音
         :param audio_chunk: 音频块，numpy 数组或 torch 张量
         :param threshold: VAD阈值 (可选，覆盖初始化值)
+        :param already_normalized: 调用方保证为 [-1, 1] 范围的 float32 时跳过标准化扫描
         :return: bool
         """
         if threshold is None:
@@ -100,27 +211,27 @@ class VADProcessor:
             raise ValueError("音频块必须是 numpy 数组或 torch 张量")
         
         # 标准化音频
-        audio_tensor = self._normalize_audio(audio_tensor)
+        if not already_normalized:
+            audio_tensor = self._normalize_audio(audio_tensor)
         
         # 确保是16kHz采样率
         current_sampling_rate = self.sampling_rate
         if current_sampling_rate != 16000:
-            resampler = torchaudio.transforms.Resample(
-                orig_freq=current_sampling_rate, 
-                new_freq=16000
-            )
-            audio_tensor = resampler(audio_tensor)
+            audio_tensor = self._resample(audio_tensor, current_sampling_rate, 16000)
             current_sampling_rate = 16000
         
-        # 检查是否有语音
-        speech_timestamps = get_speech_timestamps(
-            audio_tensor,
-            self.model,
+        # 检查是否有语音：一次模型调用得到窗口内全部 512 样本帧的概率，再向量化判定。
+        # 原 get_speech_timestamps 的 max_speech_duration_s=1.0 只会切分语音段，
+        # 不影响“是否存在语音段”，因此这里按不限最长时长处理，结果一致
+        probs = self._speech_probs(audio_tensor, current_sampling_rate)
+        speech_timestamps = _probs_to_timestamps(
+            probs,
             threshold=threshold,
-            sampling_rate=current_sampling_rate,
-            min_speech_duration_ms=100,  # 100ms 最小语音持续时间
-            max_speech_duration_s=1.0,   # 1秒最大语音持续时间
-            min_silence_duration_ms=100  # 100ms 最小静音持续时间
+            window_size=512,
+            audio_length=len(audio_tensor),
+            min_speech_samples=current_sampling_rate * 100 / 1000,  # 100ms 最小语音持续时间
+            min_silence_samples=current_sampling_rate * 100 / 1000,  # 100ms 最小静音持续时间
+            speech_pad_samples=current_sampling_rate * 30 / 1000
         )
         
         return len(speech_timestamps) > 0
@@ -181,11 +292,7 @@ class VADProcessor:
         
         # 重采样到目标采样率
         if sample_rate != target_sampling_rate:
-            resampler = torchaudio.transforms.Resample(
-                orig_freq=sample_rate,
-                new_freq=target_sampling_rate
-            )
-            waveform = resampler(waveform)
+            waveform = self._resample(waveform, sample_rate, target_sampling_rate)
             print(f"   ➡️ 重采样到 {target_sampling_rate}Hz")
         
         # 标准化音频
@@ -2,7 +2,7 @@ import os
 import time
 import logging
 import asyncio
-import traceback  # 添加 traceback 导入
+from concurrent.futures import ThreadPoolExecutor
 from config import AppConfig
 from data_basic import AudioChunk, SpeechSegment
 from typing import Optional, List, Tuple
@@ -14,6 +14,10 @@ from models_manager import asr_model_get, vad_model_get
 
 logger = logging.getLogger("speech-to-text")
 
+# 所有连接共享同一个带循环状态的 Silero 模型：推理放到单线程执行器中串行执行，
+# 既不阻塞事件循环，也保证同一时刻只有一个窗口在使用模型状态
+_vad_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vad")
+
 # ======================
 # VAD 处理器 
 # ======================
@@ -30,7 +34,12 @@ class VADProcessorManager:
         self.last_vad_time = time.time()
         self.processing_window = AppConfig.VAD_PROCESS_WINDOW  # 组合10个片段进行VAD检测
         self.chunk_accumulator = []  # 用于累积片段
+        self.max_accumulated_chunks = 4 * self.processing_window  # 积压上限，超出时丢弃最旧片段
+        # 片段长度固定，检测窗口大小不变：窗口跨越环形缓冲区末尾或片段不连续时复用同一块缓冲区拼接
+        self.window_samples = np.empty(self.processing_window * buffer_manager.samples_per_chunk, dtype=np.float32)
+        self.window_tensor = torch.from_numpy(self.window_samples)  # 与 window_samples 共享内存
         self.vad_processor = vad_model_get()
+        self.gated_ticks = 0  # 连续被噪声底门限跳过模型的检测次数
         
         # ========== 动态阈值参数 ==========
         self.current_vad_threshold = AppConfig.VAD_INITIAL_THRESHOLD  # 初始阈值 0.3
@@ -39,9 +48,23 @@ class VADProcessorManager:
         self.vad_threshold_step = AppConfig.VAD_THRESHOLD_STEP  # 每次增加步长 0.05
         self.vad_threshold_decay = AppConfig.VAD_THRESHOLD_DECAY  # 指数衰减系数 0.95
     
+    async def accumulate_and_process(self) -> Tuple[bool, Optional[int], Optional[int]]:
+        """
+        等待缓冲区凑满一个检测窗口后再执行 process_vad，避免窗口未满时的空转检测
+        返回: (状态变化, 语音开始片段ID, 语音结束片段ID)
+        """
+        needed = self.processing_window - len(self.chunk_accumulator)
+        if needed > 0:
+            self.buffer_manager.vad_wait_chunks = needed
+            self.buffer_manager.vad_ready.clear()
+            if self.buffer_manager.pending_vad_chunks < needed:
+                await self.buffer_manager.vad_ready.wait()
+        return await self.process_vad()
+    
     async def process_vad(self) -> Tuple[bool, Optional[int], Optional[int]]:
         """
         增强版VAD处理 - 按10个片段组合处理，支持动态阈值调整
+        窗口未满时立即返回，可直接轮询调用；事件驱动场景使用 accumulate_and_process
         返回: (状态变化, 语音开始片段ID, 语音结束片段ID)
         """
         # 记录VAD处理间隔
@@ -49,74 +72,90 @@ class VADProcessorManager:
         self.last_vad_time = current_time
         
         # 获取待处理的片段 - 只获取未处理的片段
-        recent_chunks = self.buffer_manager.get_chunks_for_vad()
+        # 按积压上限取全部未处理片段：事件驱动时一次会取到整个窗口，不能只取最近的平滑窗口个
+        recent_chunks = self.buffer_manager.get_chunks_for_vad(self.max_accumulated_chunks)
         
-        # 调试：记录缓冲区状态
-        if not recent_chunks:
-            logger.debug(f"🔍 无新音频片段用于VAD处理，最后处理片段ID: {self.last_processed_chunk_id}")
+        # 调试：记录缓冲区状态（累积区已有完整窗口时即使无新片段也继续处理）
+        if not recent_chunks and len(self.chunk_accumulator) < self.processing_window:
+            logger.debug("🔍 无新音频片段用于VAD处理，最后处理片段ID: %d", self.last_processed_chunk_id)
             return False, None, None
         
-        # 更新最后处理的片段ID
-        if recent_chunks[-1].chunk_id > self.last_processed_chunk_id:
-            self.last_processed_chunk_id = recent_chunks[-1].chunk_id
+        if recent_chunks:
+            # 更新最后处理的片段ID
+            if recent_chunks[-1].chunk_id > self.last_processed_chunk_id:
+                self.last_processed_chunk_id = recent_chunks[-1].chunk_id
+            
+            # 累积片段（游标按 chunk_id 递增且每个片段只返回一次，无需去重和排序）
+            self.chunk_accumulator.extend(recent_chunks)
+            self.buffer_manager.mark_processed(recent_chunks[-1].chunk_id)
         
-        # 累积片段
-        for chunk in recent_chunks:
-            if chunk.chunk_id not in [c.chunk_id for c in self.chunk_accumulator]:
-                self.chunk_accumulator.append(chunk)
+        # VAD 跟不上输入时限制积压：只保留最近的片段，保证内存有界且始终检测最新音频
+        backlog = len(self.chunk_accumulator) - self.max_accumulated_chunks
+        if backlog > 0:
+            logger.warning("⚠️ VAD 积压 %d 个片段，丢弃最旧的片段 %d-%d",
+                           backlog, self.chunk_accumulator[0].chunk_id, self.chunk_accumulator[backlog - 1].chunk_id)
+            del self.chunk_accumulator[:backlog]
 
         # 检查是否累积了足够的片段
         if len(self.chunk_accumulator) < self.processing_window:
-            logger.debug(f"⏳ 等待更多片段用于VAD处理，当前: {len(self.chunk_accumulator)}/{self.processing_window}")
+            logger.debug("⏳ 等待更多片段用于VAD处理，当前: %d/%d", len(self.chunk_accumulator), self.processing_window)
             return False, None, None
         
-        # 确保片段按时间顺序排列
-        self.chunk_accumulator.sort(key=lambda x: x.chunk_id)
-        
-        logger.debug(f"🔍 开始VAD处理，片段ID范围: {self.chunk_accumulator[0].chunk_id}-{self.chunk_accumulator[-1].chunk_id}, 当前阈值: {self.current_vad_threshold:.2f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 开始VAD处理，片段ID范围: %d-%d, 当前阈值: %.2f",
+                         self.chunk_accumulator[0].chunk_id, self.chunk_accumulator[-1].chunk_id, self.current_vad_threshold)
         
         state_changed = False
         speech_start_id = None
         speech_end_id = None
         
         try:
-            # 组合10个片段的音频数据
-            combined_audio = bytearray()
-            for chunk in self.chunk_accumulator[:self.processing_window]:
-                combined_audio.extend(chunk.audio_data)
-            
-            # 转换为tensor进行VAD处理
-            audio_array = np.frombuffer(bytes(combined_audio), dtype=np.int16)
-            if len(audio_array) == 0:
-                logger.warning("⚠️ 无效音频数据，跳过VAD处理")
-                self.chunk_accumulator = self.chunk_accumulator[self.processing_window:]
-                return False, None, None
-            
-            logger.debug(f"🔊 处理VAD组合数据，总样本数: {len(audio_array)}, 片段数: {self.processing_window}, 阈值: {self.current_vad_threshold:.2f}")
+            # 组合10个片段的音频数据：片段ID连续时直接取环形缓冲区上的视图（零拷贝，
+            # 仅跨越末尾时拼接一次），否则将各片段视图拼接写入复用的窗口缓冲区
+            window_chunks = self.chunk_accumulator[:self.processing_window]
+            first_id = window_chunks[0].chunk_id
+            if (window_chunks[-1].chunk_id - first_id == self.processing_window - 1
+                    and first_id >= self.buffer_manager.oldest_chunk_id):
+                window = self.buffer_manager.get_samples_by_range(
+                    first_id, first_id + self.processing_window - 1, out=self.window_samples)
+            else:
+                window = np.concatenate([chunk.audio_data for chunk in window_chunks], out=self.window_samples)
+            # 拼接结果写入了复用缓冲区时直接复用其张量视图，环形缓冲区视图则零拷贝包装
+            audio_tensor = self.window_tensor if window is self.window_samples else torch.from_numpy(window)
             
-            audio_array = audio_array.copy()
-            audio_tensor = torch.tensor(audio_array, dtype=torch.float32)
-            audio_tensor = audio_tensor / 32768.0
+            logger.debug("🔊 处理VAD组合数据，总样本数: %d, 片段数: %d, 阈值: %.2f",
+                         len(window), self.processing_window, self.current_vad_threshold)
 
-            # ========== 使用动态阈值进行VAD检测 ==========
-            is_speech = self.vad_processor.is_voice_active(
-                audio_tensor.squeeze(), 
-                threshold=self.current_vad_threshold  # 使用当前动态阈值
-            )
+            # 噪声底门限：窗口峰值过低时直接判定为静音，不调用模型；
+            # 每隔 VAD_FULL_CHECK_INTERVAL 次仍强制运行一次模型，避免门限设置不当时永久失聪
+            peak = max(float(window.max()), -float(window.min()))
+            if peak < AppConfig.VAD_NOISE_FLOOR and self.gated_ticks + 1 < AppConfig.VAD_FULL_CHECK_INTERVAL:
+                self.gated_ticks += 1
+                is_speech = False
+                logger.debug("🔇 VAD窗口峰值低于噪声底 (%.5f)，跳过模型检测", peak)
+            else:
+                self.gated_ticks = 0
+                # ========== 使用动态阈值进行VAD检测 ==========
+                is_speech = await asyncio.get_running_loop().run_in_executor(
+                    _vad_executor,
+                    lambda: self.vad_processor.is_voice_active(
+                        audio_tensor, 
+                        threshold=self.current_vad_threshold,  # 使用当前动态阈值
+                        already_normalized=True
+                    )
+                )
+            
+            # 平滑窗口可通过 /vad/config 在运行时修改，每次检测读取一次
+            smoothing_window = AppConfig.VAD_SMOOTHING_WINDOW
             
+            # 计数始终为整数：一侧加一并封顶，另一侧平滑减一并保底
             if is_speech:
-                self.speech_count += 1
-                self.speech_count = min(self.speech_count, AppConfig.VAD_SMOOTHING_WINDOW)
+                self.speech_count = min(self.speech_count + 1, smoothing_window)
                 self.silence_count = max(0, self.silence_count - 1)  # 平滑减少静音计数
             else:
-                self.silence_count += 1
-                self.silence_count = min(self.silence_count, AppConfig.VAD_SMOOTHING_WINDOW)
+                self.silence_count = min(self.silence_count + 1, smoothing_window)
                 self.speech_count = max(0, self.speech_count - 1)
             
-            # 确保计数是整数
-            self.speech_count = int(self.speech_count)
-            self.silence_count = int(self.silence_count)
-            
             # ========== 动态阈值调整逻辑 ==========
             prev_threshold = self.current_vad_threshold
             
@@ -127,7 +166,8 @@ class VADProcessorManager:
                 self.speech_start_time = self.chunk_accumulator[0].timestamp
                 speech_start_id = self.chunk_accumulator[0].chunk_id
                 state_changed = True
-                logger.info(f"🎙️ 语音开始检测，组合片段ID: {speech_start_id}-{self.chunk_accumulator[-1].chunk_id} 语音计数: {self.speech_count}, 阈值: {self.current_vad_threshold:.2f}")
+                logger.info("🎙️ 语音开始检测，组合片段ID: %d-%d 语音计数: %d, 阈值: %.2f",
+                            speech_start_id, self.chunk_accumulator[-1].chunk_id, self.speech_count, self.current_vad_threshold)
                 
                 # 开始提升阈值（但不超过最大值）
                 new_threshold = min(
@@ -136,7 +176,7 @@ class VADProcessorManager:
                 )
                 # 指数衰减平滑过渡
                 self.current_vad_threshold =  new_threshold
-                logger.debug(f"📈 语音开始 - 阈值提升: {prev_threshold:.2f} → {self.current_vad_threshold:.2f}")
+                logger.debug("📈 语音开始 - 阈值提升: %.2f → %.2f", prev_threshold, self.current_vad_threshold)
             
             # 情况2: 语音中持续检测 - 逐渐提升阈值
             elif self.vad_is_speaking and self.speech_count > 0:
@@ -148,10 +188,10 @@ class VADProcessorManager:
                 # 指数衰减平滑过渡
                 self.current_vad_threshold = new_threshold
                 
-                logger.info(f"📈 语音持续 - 阈值提升: {prev_threshold:.2f} → {self.current_vad_threshold:.2f}")
+                logger.info("📈 语音持续 - 阈值提升: %.2f → %.2f", prev_threshold, self.current_vad_threshold)
             
             # 情况3: 检测到语音结束 - 重置阈值
-            elif self.vad_is_speaking and self.silence_count >= AppConfig.VAD_SMOOTHING_WINDOW:
+            elif self.vad_is_speaking and self.silence_count >= smoothing_window:
                 self.vad_is_speaking = False
                 speech_end_id = self.chunk_accumulator[-1].chunk_id
                 state_changed = True
@@ -159,10 +199,12 @@ class VADProcessorManager:
                 # 重置阈值到最小值
                 prev_threshold = self.current_vad_threshold
                 self.current_vad_threshold = self.vad_threshold_min
-                logger.info(f"⏹️ 语音结束检测，组合片段ID: {self.chunk_accumulator[0].chunk_id}-{speech_end_id} 静音计数: {self.silence_count}, 阈值重置: {prev_threshold:.2f} → {self.current_vad_threshold:.2f}")
+                logger.info("⏹️ 语音结束检测，组合片段ID: %d-%d 静音计数: %d, 阈值重置: %.2f → %.2f",
+                            self.chunk_accumulator[0].chunk_id, speech_end_id, self.silence_count,
+                            prev_threshold, self.current_vad_threshold)
             
             # 情况4: 长时间无语音 - 确保阈值保持在最小值
-            elif not self.vad_is_speaking and self.silence_count >= AppConfig.VAD_SMOOTHING_WINDOW:
+            elif not self.vad_is_speaking and self.silence_count >= smoothing_window:
                 self.current_vad_threshold = self.vad_threshold_min
             
             # ========== 边界保护 ==========
@@ -173,7 +215,7 @@ class VADProcessorManager:
             self.chunk_accumulator = self.chunk_accumulator[self.processing_window:]
             
         except Exception as e:
-            logger.error(f"❌ VAD组合处理失败: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"❌ VAD组合处理失败: {str(e)}", exc_info=True)
             # 异常时重置阈值到安全值
             self.current_vad_threshold = max(self.vad_threshold_min, min(self.vad_threshold_max, self.current_vad_threshold))
             # 清除缓冲区以避免卡住
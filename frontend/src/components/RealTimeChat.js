@@ -69,6 +69,7 @@ export class RealTimeChat {
         // 分层输出相关
         this.segments = new Map();
         this.speechSegments = new Map();
+        this.tentativeTexts = new Map(); // segment_id -> 累积的临时文本
         this.currentTemporaryElement = null;
         this.lastChunkId = -1;
         
@@ -588,6 +589,7 @@ AudioWorklet 初始化失败，请检查：
         const handlers = {
             'connection_established': () => this.handleConnectionEstablished(data),
             'tentative_output': () => this.handleTentativeOutput(data),
+            'tentative_batch': () => (data.items || []).forEach(item => this.handleTentativeOutput(item)),
             'committed_output': () => this.handleCommittedOutput(data),
             'pong': () => console.log('🏓 收到服务器 pong 响应'),
             'debug_audio_info': () => console.log('📁 调试音频信息:', data),
@@ -614,7 +616,11 @@ AudioWorklet 初始化失败，请检查：
     }
 
     handleTentativeOutput(data) {
-        const { text, start_chunk_id: startChunkId, end_chunk_id: endChunkId, timestamp } = data;
+        const { current_text: currentText, segment_id: segmentId, start_chunk_id: startChunkId, end_chunk_id: endChunkId, timestamp } = data;
+        
+        // 服务器只发送增量文本，在客户端按语音段累积
+        const text = (this.tentativeTexts.get(segmentId) || '') + (currentText || '');
+        this.tentativeTexts.set(segmentId, text);
         
         if (!text?.trim() || startChunkId === undefined || endChunkId === undefined) {
             console.warn('⚠️ 无效的临时输出数据:', data);
@@ -651,6 +657,9 @@ AudioWorklet 初始化失败，请检查：
             return;
         }
         
+        // 语音段已确认，其临时文本不再需要继续累积
+        this.tentativeTexts.clear();
+        
         // 1. 移除相关的临时元素
         this.removeTemporaryElementsForRange(startChunkId, endChunkId);
         
@@ -797,6 +806,7 @@ AudioWorklet 初始化失败，请检查：
     clearTranscriptState() {
         this.segments.clear();
         this.speechSegments.clear();
+        this.tentativeTexts.clear();
         this.clearTemporaryElement();
     }
 